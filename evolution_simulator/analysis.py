@@ -0,0 +1,150 @@
+import csv
+import tempfile
+import typing as t
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from .serializer.stream import Generation, iter_generations
+
+if t.TYPE_CHECKING:
+    from .serializer.segments import Segment
+    from .serializer.serializer import SerializerBase
+
+MOVE_COUNT = 9  # every combination of -1, 0, 1 offsets on both axes
+
+OUTPUT_SUFFIXES = ('.npz', '.csv')
+
+SUMMARY_COLUMNS = ('generation', 'survivors', 'mean_displacement', 'mean_distance', 'movement_entropy',
+                   'mean_zone_occupancy', 'final_zone_occupancy')
+
+
+class ArrayStream:
+    """Rows of an array spilled to a temporary file as they are produced, then stored in an npz archive."""
+
+    def __init__(self, dtype, row_shape: tuple = ()):
+        self.dtype = np.dtype(dtype)
+        self.row_shape = row_shape
+        self.rows = 0
+        self.file = tempfile.TemporaryFile()
+
+    def append(self, row):
+        self.file.write(np.ascontiguousarray(row, self.dtype).tobytes())
+        self.rows += 1
+
+    def write_to(self, archive: zipfile.ZipFile, name: str):
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                  'shape': (self.rows, *self.row_shape)}
+        self.file.seek(0)
+        with archive.open(f'{name}.npy', 'w', force_zip64=True) as f:
+            np.lib.format.write_array_header_1_0(f, header)
+            while chunk := self.file.read(1 << 20):
+                f.write(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+def movement_entropy(offsets: np.ndarray) -> float:
+    # Shannon entropy in bits of the distribution of moves over all entity steps
+    counts = np.bincount(((offsets[..., 0] + 1) * 3 + offsets[..., 1] + 1).ravel(), minlength=MOVE_COUNT)
+    probabilities = counts[counts > 0] / counts.sum()
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def generation_positions(generation: Generation) -> t.Tuple[np.ndarray, np.ndarray]:
+    # (steps + 1, entities, 2) positions starting with the initial ones, and the (steps, entities, 2) offsets
+    offsets = generation.offsets()
+    positions = np.empty((offsets.shape[0] + 1, *offsets.shape[1:]), np.int16)
+    positions[0] = generation.initial_positions
+    np.cumsum(offsets, axis=0, dtype=np.int16, out=positions[1:])
+    positions[1:] += positions[0]
+    return positions, offsets
+
+
+class Analysis:
+    def __init__(self, deserializer: 'SerializerBase.Deserializer', first_generation: int = 0):
+        self.deserializer = deserializer
+        self.first_generation = first_generation
+        self.grid_shape = deserializer.params.grid.x, deserializer.params.grid.y
+        self.selection_pressure = deserializer.selection_pressure
+
+        steps = deserializer.params.generationSteps
+        self.columns = {name: ArrayStream(np.uint32 if name in ('generation', 'survivors') else np.float64)
+                        for name in SUMMARY_COLUMNS}
+        self.zone_occupancy = ArrayStream(np.float32, (steps + 1,))
+        self.heatmaps = ArrayStream(np.uint32, self.grid_shape)
+        self.heatmap_total = np.zeros(self.grid_shape, np.uint64)
+
+    def add(self, generation: Generation) -> dict:
+        positions, offsets = generation_positions(generation)
+        x, y = positions[..., 0], positions[..., 1]
+
+        heatmap = np.zeros(self.grid_shape, np.uint32)
+        np.add.at(heatmap, (x.ravel(), y.ravel()), 1)
+        self.heatmap_total += heatmap
+        self.heatmaps.append(heatmap)
+
+        zone_occupancy = self.selection_pressure.zone(x, y).mean(axis=1)
+        self.zone_occupancy.append(zone_occupancy)
+
+        row = {
+            'generation': self.first_generation + generation.number,
+            'survivors': generation.survivors,
+            'mean_displacement': float(np.hypot(*(positions[-1] - positions[0]).T).mean()),
+            'mean_distance': float(np.hypot(*offsets.astype(np.float32).T).sum(axis=1).mean()),
+            'movement_entropy': movement_entropy(offsets),
+            'mean_zone_occupancy': float(zone_occupancy.mean()),
+            'final_zone_occupancy': float(zone_occupancy[-1]),
+        }
+        for name, value in row.items():
+            self.columns[name].append(value)
+        return row
+
+    def save(self, path):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, column in self.columns.items():
+                column.write_to(archive, name)
+            self.zone_occupancy.write_to(archive, 'zone_occupancy')
+            self.heatmaps.write_to(archive, 'heatmaps')
+            with archive.open('heatmap_total.npy', 'w') as f:
+                np.lib.format.write_array(f, self.heatmap_total)
+
+    def close(self):
+        for stream in (*self.columns.values(), self.zone_occupancy, self.heatmaps):
+            stream.close()
+
+
+def output_stem(out_path: Path) -> Path:
+    # analyze -o results.npz writes results.npz and results.csv, not results.npz.npz
+    return out_path.with_suffix('') if out_path.suffix in OUTPUT_SUFFIXES else out_path
+
+
+def analyze(deserializer: 'SerializerBase.Deserializer', out_path: Path, first_generation: int = 0) -> int:
+    """Stream a recording through the analysis, writing per generation rows to out_path.csv as they are computed and
+    all arrays to out_path.npz at the end. Only one generation is decoded at a time.
+    """
+    out_path = output_stem(out_path)
+    analysis = Analysis(deserializer, first_generation)
+    count = 0
+    try:
+        with open(out_path.with_name(out_path.name + '.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, SUMMARY_COLUMNS)
+            writer.writeheader()
+            for generation in iter_generations(deserializer):
+                writer.writerow(analysis.add(generation))
+                count += 1
+        analysis.save(out_path.with_name(out_path.name + '.npz'))
+    finally:
+        analysis.close()
+    return count
+
+
+def analyze_segment(path: Path, segment: 'Segment', out_path: Path) -> t.Tuple['Segment', int]:
+    from .serializer.serializer import open_deserializer
+
+    out_path = output_stem(out_path)
+    with open_deserializer(path) as deserializer:
+        return segment, analyze(deserializer, out_path.with_name(f'{out_path.name}.{segment.name.split(".")[0]}'),
+                                segment.first_generation)
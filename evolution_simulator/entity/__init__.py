@@ -3,7 +3,7 @@ import typing as t
 import numpy as np
 
 from .entity_io import actions
-from .genome import Gene, Genome, NeuralNetwork
+from .genome import Gene, Genome, Lineage, NeuralNetwork
 from ..models import Coord, Direction
 
 if t.TYPE_CHECKING:
@@ -11,11 +11,12 @@ if t.TYPE_CHECKING:
 
 
 class Entity:
-    def __init__(self, index, loc: Coord, nn: NeuralNetwork, genome: Genome, prng, k):
+    def __init__(self, index, loc: Coord, nn: NeuralNetwork, genome: Genome, prng, k, lineage: Lineage = None):
         self.index = index
         self.loc = loc
         self.nn = nn
         self.genome = genome
+        self.lineage = lineage
 
         self.age = 0
         self.responsiveness = 0.5
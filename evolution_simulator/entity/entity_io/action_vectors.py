@@ -26,7 +26,7 @@ class MovementGroup(Group):
         sign_x = -1 if self.moveX < 0 else 1
         sign_y = -1 if self.moveY < 0 else 1
 
-        offset = Coord(prob_x * sign_x, prob_y * sign_y)
+        offset = Coord.unit(prob_x * sign_x, prob_y * sign_y)
         if offset:
             entity.move(offset, sim)
 
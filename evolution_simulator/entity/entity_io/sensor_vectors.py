@@ -22,15 +22,15 @@ def population_along_axis(location, direction, sim):
     vec_x = direction.x / length
     vec_y = direction.y / length
 
-    def callback(tloc):
-        if tloc != location and sim.entity_at_pos(tloc):
-            offset = tloc - location
-            proj = vec_x * offset.x + vec_y * offset.y
-            pop_sum[0] += proj / (offset.x * offset.x + offset.y * offset.y)
+    def callback(x, y):
+        if (x != location.x or y != location.y) and sim.grid[x, y]:
+            offset_x, offset_y = x - location.x, y - location.y
+            proj = vec_x * offset_x + vec_y * offset_y
+            pop_sum[0] += proj / (offset_x * offset_x + offset_y * offset_y)
 
-    location.visit_neighbourhood(sim.Parameters.World.grid_x, sim.Parameters.World.grid_y,
-                                 sim.Parameters.Simulation.population_sensor_radius, callback)
-    return ((pop_sum[0] / (6 * sim.Parameters.Simulation.population_sensor_radius)) + 1) / 2
+    world, radius = sim.Parameters.World, sim.Parameters.Simulation.population_sensor_radius
+    location.visit_neighbourhood(world.grid_x, world.grid_y, radius, callback)
+    return ((pop_sum[0] / (6 * radius)) + 1) / 2
 
 
 class LocX(SensorBase):
@@ -60,8 +60,9 @@ class BoundaryDistX(SensorBase):
 
     @classmethod
     def execute(cls, entity, simulator):
-        min_x = min(entity.loc.x, (simulator.Parameters.World.grid_x - entity.loc.x) - 1)
-        return min_x / (simulator.Parameters.World.grid_x / 2)
+        grid_x = simulator.Parameters.World.grid_x
+        min_x = min(entity.loc.x, (grid_x - entity.loc.x) - 1)
+        return min_x / (grid_x / 2)
 
 
 class BoundaryDist(SensorBase):
@@ -72,10 +73,11 @@ class BoundaryDist(SensorBase):
 
     @classmethod
     def execute(cls, entity, simulator):
-        min_x = min(entity.loc.x, (simulator.Parameters.World.grid_x - entity.loc.x) - 1)
-        min_y = min(entity.loc.y, (simulator.Parameters.World.grid_y - entity.loc.y) - 1)
+        world = simulator.Parameters.World
+        min_x = min(entity.loc.x, (world.grid_x - entity.loc.x) - 1)
+        min_y = min(entity.loc.y, (world.grid_y - entity.loc.y) - 1)
         closest = min(min_x, min_y)
-        max_possible = max(simulator.Parameters.World.grid_x / 2 - 1, simulator.Parameters.World.grid_y / 2 - 1)
+        max_possible = max(world.grid_x / 2 - 1, world.grid_y / 2 - 1)
         return closest / max_possible
 
 
@@ -87,8 +89,9 @@ class BoundaryDistY(SensorBase):
 
     @classmethod
     def execute(cls, entity, simulator):
-        min_y = min(entity.loc.y, (simulator.Parameters.World.grid_y - entity.loc.y) - 1)
-        return min_y / (simulator.Parameters.World.grid_y / 2)
+        grid_y = simulator.Parameters.World.grid_y
+        min_y = min(entity.loc.y, (grid_y - entity.loc.y) - 1)
+        return min_y / (grid_y / 2)
 
 
 class GeneticSimilarityForward(SensorBase):
@@ -102,11 +105,12 @@ class GeneticSimilarityForward(SensorBase):
         if simulator.loc_in_bounds(fwd) and simulator.entity_at_pos(fwd):
             other = simulator.entities[simulator[fwd] - 1]
             if other.alive:
-                if simulator.Parameters.Entities.genetic_difference_algorithm == 0:
+                algorithm = simulator.Parameters.Entities.genetic_difference_algorithm
+                if algorithm == 0:
                     return jaro_winkler(entity.genome, other.genome)
-                elif simulator.Parameters.Entities.genetic_difference_algorithm == 1:
+                elif algorithm == 1:
                     return hamming_bits(entity.genome, other.genome)
-                elif simulator.Parameters.Entities.genetic_difference_algorithm == 2:
+                elif algorithm == 2:
                     return hamming_bytes(entity.genome, other.genome)
                 else:
                     raise
@@ -143,14 +147,16 @@ class ProbePopulationFwd(SensorBase):
     @classmethod
     def execute(cls, entity, simulator):
         long_probe_distance = simulator.Parameters.Simulation.long_probe_distance
-        loc = entity.loc
-        direction = entity.prev_dir
+        world = simulator.Parameters.World
+        x, y = entity.loc.x, entity.loc.y
+        step = entity.prev_dir.offset
 
         for count in range(long_probe_distance):
-            loc += direction
-            if not simulator.loc_in_bounds(loc):
+            x += step.x
+            y += step.y
+            if not (0 <= x < world.grid_x and 0 <= y < world.grid_y):
                 return 1
-            if simulator.entity_at_pos(loc):
+            if simulator.grid[x, y]:
                 return count / long_probe_distance
 
         return (count + 1) / long_probe_distance
@@ -165,9 +171,9 @@ class Population(SensorBase):
     def execute(cls, entity, simulator):
         counts = [0, 0]
 
-        def tally_entities(pos):
+        def tally_entities(x, y):
             counts[0] += 1
-            if simulator.entity_at_pos(pos):
+            if simulator.grid[x, y]:
                 counts[1] += 1
 
         p = simulator.Parameters
@@ -1,2 +1,2 @@
-from .genome import NEURON, SENSOR, ACTION, Gene, Genome, generate_child_genome, mutate_genome
+from .genome import NEURON, SENSOR, ACTION, Gene, Genome, Lineage, generate_child, generate_child_genome, mutate_genome
 from .neural_network import NeuralNetwork
@@ -1,6 +1,7 @@
 import ctypes
 import typing as t
 from ctypes import c_uint32
+from dataclasses import dataclass
 
 from ...serializer.structures import BytesConvertable
 
@@ -45,6 +46,14 @@ class GeneContainer(ctypes.Union):
 Genome = t.List[Gene]
 
 
+@dataclass
+class Lineage:
+    base: int  # index of the parent genome the child is copied from
+    donor: int  # index of the parent genome the crossover range is copied from
+    crossover_start: int
+    crossover_stop: int
+
+
 def mutate_genome(genome: Genome, prng, point_mutation_rate):
     for _ in range(len(genome)):
         if prng.random() < point_mutation_rate:
@@ -67,8 +76,8 @@ def copy_genome(genome: Genome):
     return [Gene.from_bytes(gene.to_bytes()) for gene in genome]
 
 
-def generate_child_genome(prng, genomes: t.List[Genome], by_fitness: bool, sexual_reproduction: bool,
-                          point_mutation_rate: float):
+def generate_child(prng, genomes: t.List[Genome], by_fitness: bool, sexual_reproduction: bool,
+                   point_mutation_rate: float) -> t.Tuple[Genome, Lineage]:
     genomes_length = len(genomes)
     if by_fitness and genomes_length > 1:
         parent1 = prng.integers(1, genomes_length)
@@ -81,14 +90,21 @@ def generate_child_genome(prng, genomes: t.List[Genome], by_fitness: bool, sexua
 
     if sexual_reproduction:
         genome2 = copy_genome(genomes[parent2])
-        shorter, genome = sorted((genome1, genome2), key=len)
+        (donor, shorter), (base, genome) = sorted(((parent1, genome1), (parent2, genome2)), key=lambda p: len(p[1]))
         shorter_len = len(shorter)
         index1 = prng.integers(0, shorter_len)
         index2 = prng.integers(index1, shorter_len)
 
         for i in range(index1, index2 + 1):
             genome[i] = shorter[i]
+        lineage = Lineage(int(base), int(donor), int(index1), int(index2) + 1)
     else:
         genome = genome1
+        lineage = Lineage(int(parent1), int(parent1), 0, 0)
     mutate_genome(genome, prng, point_mutation_rate)
-    return genome
+    return genome, lineage
+
+
+def generate_child_genome(prng, genomes: t.List[Genome], by_fitness: bool, sexual_reproduction: bool,
+                          point_mutation_rate: float):
+    return generate_child(prng, genomes, by_fitness, sexual_reproduction, point_mutation_rate)[0]
@@ -1,9 +1,15 @@
 import argparse
 import gzip
+from contextlib import nullcontext
+from functools import partial
+from io import BytesIO
 from pathlib import Path
+from time import perf_counter
 
 from numpy.random import default_rng
 
+from .serializer.serializer import COMPRESSIONS, GENOME_ENCODINGS
+
 
 def main(args):
     args = parser.parse_args(args=args)
@@ -11,9 +17,11 @@ def main(args):
 
 
 def evolve(args):
+    from .parameters import load_parameters
     from .simulator import Simulator
 
     prng = default_rng(seed=args.seed)
+    parameters = load_parameters(args.config and args.config.read_text(encoding='UTF-8'))
 
     if args.generations is not None:
         def until(sim):
@@ -21,15 +29,51 @@ def evolve(args):
     else:
         until = None
 
-    with gzip.open(args.filename, 'wb') as f:
-        simulator = Simulator(prng, f)
-        simulator.run(until=until)
+    if args.format == 0:
+        if args.compression == 'lzma':
+            raise ValueError('V0 recordings are either gzip compressed or uncompressed')
+        options = {}
+    elif args.format == 1:
+        options = {'compression': COMPRESSIONS[args.compression], 'genome_encoding': GENOME_ENCODINGS[args.genomes],
+                   'genome_keyframe_interval': args.genome_keyframes,
+                   'position_keyframe_interval': args.position_keyframes}
+    else:
+        options = {'compression': COMPRESSIONS[args.compression], 'seed': args.seed}
+
+    if args.live is not None:
+        from .serializer.serializer import SerializerLive
+
+        fd = BytesIO()
+        args.format = SerializerLive.version
+        options = {'socket_path': args.live, 'compression': COMPRESSIONS[args.compression],
+                   'genome_encoding': GENOME_ENCODINGS[args.genomes]}
+    elif args.filename is None:
+        evolve_parser.error('an output file or --live is required')
+    elif args.segment_generations or args.segment_size:
+        from .serializer.segments import SegmentedSerializer
+
+        fd = nullcontext()
+        options.update(serializer_type=SegmentedSerializer, directory=args.filename, segment_version=args.format,
+                       segment_generations=args.segment_generations,
+                       segment_size=args.segment_size and int(args.segment_size * (1 << 20)),
+                       gzip_segments=args.compression != 'none')
+    elif args.format == 0:
+        fd = (open if args.compression == 'none' else gzip.open)(args.filename, 'wb')
+    else:
+        fd = open(args.filename, 'wb')
+
+    with fd as f:
+        simulator = Simulator(prng, f, args.format, parameters, **options)
+        try:
+            simulator.run(until=until)
+        finally:
+            simulator.serializer.close()
 
     return simulator
 
 
 def render(args):
-    from .serializer.serializer import get_serializer
+    from .serializer.serializer import open_deserializer
     from .renderer.cv import Renderer
 
     renderer_args = {}
@@ -38,8 +82,24 @@ def render(args):
         if attr is not None:
             renderer_args[argname] = attr
 
-    with gzip.open(args.filename, 'rb') as f:
-        deserializer = get_serializer(f).Deserializer()
+    if args.jobs is not None:
+        from .renderer.cv.parallel import render_parallel
+
+        if args.live is not None:
+            raise ValueError('a live run cannot be rendered in parallel')
+        if args.video is None and args.out_dir is None:
+            raise ValueError('rendering in parallel needs --video or --output')
+        return render_parallel(args.filename, args.jobs, **renderer_args)
+
+    if args.live is not None:
+        from .serializer.live import connect
+        from .serializer.serializer import get_serializer
+
+        recording = nullcontext(get_serializer(connect(args.live)).Deserializer())
+    else:
+        recording = open_deserializer(args.filename)
+
+    with recording as deserializer:
         renderer = Renderer(
             deserializer,
             **renderer_args
@@ -47,6 +107,89 @@ def render(args):
         return renderer.run()
 
 
+def index(args):
+    from .serializer.gzip_index import build_gzip_index, sidecar_path
+    from .serializer.serializer import DATA_START, SerializerV0, get_serializer
+
+    with gzip.open(args.filename, 'rb') as f:
+        serializer = get_serializer(f)
+        if serializer is None or serializer.version != SerializerV0.version:
+            raise ValueError(f'{args.filename} is not a gzip compressed V0 recording')
+        deserializer = serializer.Deserializer()
+
+    start = perf_counter()
+    index = build_gzip_index(args.filename, DATA_START, deserializer.generation_size_stats,
+                             SerializerV0.stat_format, int(args.span * (1 << 20)))
+    index.save(sidecar_path(args.filename))
+    print(f'Indexed {len(index.generations)} generations with {len(index.points)} restart points '
+          f'in {perf_counter() - start:.2f}s')
+    return index
+
+
+def transcode(args):
+    from .serializer.serializer import open_deserializer
+    from .serializer.transcode import read_payloads, transcode
+
+    start = perf_counter()
+    size, compressed_size = transcode(args.filename, args.out_filename, COMPRESSIONS[args.compression], args.level,
+                                      args.jobs)
+    elapsed = perf_counter() - start
+    print(f'Transcoded {size / (1 << 20):.1f} MB to {compressed_size / (1 << 20):.1f} MB '
+          f'in {elapsed:.2f}s ({size / (1 << 20) / elapsed:.1f} MB/s)')
+
+    if args.verify:
+        start = perf_counter()
+        with open_deserializer(args.filename) as source:
+            for stats, payload in read_payloads(args.out_filename, args.jobs):
+                if source.next_generation() != stats or bytes(source.read_payload()) != payload:
+                    raise ValueError(f'Generation {source.generation} differs from the source')
+                source.skip_stats()
+            if source.next_generation() is not None:
+                raise ValueError(f'{args.out_filename} is missing generations from generation {source.generation}')
+        elapsed = perf_counter() - start
+        print(f'Verified in {elapsed:.2f}s ({size / (1 << 20) / elapsed:.1f} MB/s)')
+
+
+def analyze(args):
+    from .analysis import analyze, analyze_segment
+    from .serializer.segments import is_segmented, map_segments
+    from .serializer.serializer import open_deserializer
+
+    start = perf_counter()
+    if is_segmented(args.filename):
+        # Every segment is analyzed on its own, into <output>.<segment>.csv/npz
+        count = 0
+        for segment, segment_count in map_segments(partial(analyze_segment, out_path=args.out_path), args.filename,
+                                                   args.jobs, args.follow):
+            print(f'Analyzed {segment.name}, generations {segment.first_generation} to '
+                  f'{segment.first_generation + segment_count - 1}')
+            count += segment_count
+    else:
+        with open_deserializer(args.filename) as deserializer:
+            count = analyze(deserializer, args.out_path)
+    print(f'Analyzed {count} generations in {perf_counter() - start:.2f}s')
+    return count
+
+
+def networks(args):
+    from .renderer.render_nn_diagram import render_networks
+
+    start = perf_counter()
+    count = render_networks(args.filename, args.generation, args.out_dir, args.top, args.distinct, args.jobs)
+    print(f'Rendered {count} networks of generation {args.generation} in {perf_counter() - start:.2f}s')
+    return count
+
+
+def sweep(args):
+    from .sweep import SweepSpec, sweep
+
+    start = perf_counter()
+    count = sweep(SweepSpec.load(args.spec), args.out_path, args.config and args.config.read_text(encoding='UTF-8'),
+                  args.jobs)
+    print(f'Finished {count} runs in {perf_counter() - start:.2f}s')
+    return count
+
+
 def valid_file(path):
     if (file := Path(path)).is_file():
         return file
@@ -54,6 +197,31 @@ def valid_file(path):
         raise FileNotFoundError(path)
 
 
+def valid_path(path):
+    if (file := Path(path)).exists():
+        return file
+    else:
+        raise FileNotFoundError(path)
+
+
+def valid_range(low, high):
+    def valid_int(text):
+        if not low <= (value := int(text)) <= high:
+            raise argparse.ArgumentTypeError(f'{value} is not between {low} and {high}')
+        return value
+    return valid_int
+
+
+def valid_slice(text):
+    # A:B[:stride] with Python slice semantics, a single number selects just that one
+    values = [int(value) if value else None for value in text.split(':')]
+    if len(values) == 1 and values[0] is not None:
+        return slice(values[0], values[0] + 1 or None)
+    if not 2 <= len(values) <= 3:
+        raise ValueError(text)
+    return slice(*values)
+
+
 parser = argparse.ArgumentParser(
     prog='evolution_simulator',
     description='Evolution simulator in a grid',
@@ -65,13 +233,34 @@ subparsers = parser.add_subparsers(required=True, title='subcommands')
 
 evolve_parser = subparsers.add_parser('evolve')
 evolve_parser.set_defaults(func=evolve)
-evolve_parser.add_argument('-o', '--output', dest='filename', required=True, metavar='FILE', type=Path)
+evolve_parser.add_argument('-o', '--output', dest='filename', metavar='FILE', type=Path,
+                           help='recording file, or directory of segments when segmenting')
 evolve_parser.add_argument('--seed', type=int, default=42)
+evolve_parser.add_argument('-c', '--config', metavar='FILE', type=valid_file,
+                           help='YAML parameters, the bundled config.yml by default')
 evolve_parser.add_argument('-g', '--generations', type=int)
+evolve_parser.add_argument('-f', '--format', type=int, choices=(0, 1, 2), default=0,
+                           help='0: gzip or raw stream, 1: indexed blocks, 2: replay from the generator state')
+evolve_parser.add_argument('--compression', choices=tuple(COMPRESSIONS), default='zlib')
+evolve_parser.add_argument('--genomes', choices=tuple(GENOME_ENCODINGS), default='raw', help='V1 genome encoding')
+evolve_parser.add_argument('--genome-keyframes', dest='genome_keyframes', type=valid_range(1, 0xFFFF), default=32,
+                           metavar='N', help='generations between full genome keyframes of the lineage encoding')
+evolve_parser.add_argument('--position-keyframes', dest='position_keyframes', type=valid_range(0, 0xFFFF), default=0,
+                           metavar='K', help='store V1 entity positions every K steps for step seeking, 0 disables them')
+evolve_parser.add_argument('--segment-generations', dest='segment_generations', type=int, metavar='N',
+                           help='start a new segment file every N generations')
+evolve_parser.add_argument('--segment-size', dest='segment_size', type=float, metavar='MB',
+                           help='start a new segment file once the current one reaches this size')
+evolve_parser.add_argument('--live', metavar='SOCKET', type=Path,
+                           help='publish the run on a Unix socket for render --live instead of writing a file')
 
-render_parser = subparsers.add_parser('render')
+render_parser = subparsers.add_parser('render', description='While frames are shown q quits, comma and period '
+                                                             'seek back and forward a generation, < and > ten. '
+                                                             'Seeking needs an indexed recording.')
 render_parser.set_defaults(func=render)
-render_parser.add_argument('-i', '--input', dest='filename', required=True, metavar='FILE', type=valid_file)
+render_source = render_parser.add_mutually_exclusive_group(required=True)
+render_source.add_argument('-i', '--input', dest='filename', metavar='FILE', type=valid_file)
+render_source.add_argument('--live', metavar='SOCKET', type=Path, help='attach to a running evolve --live')
 render_parser.add_argument('-o', '--output', dest='out_dir', metavar='FILE', type=Path)
 render_parser.add_argument('--hide-frames', dest='show_frames', action='store_false', default=True)
 render_parser.add_argument('--frame-size', dest='frame_size', type=int)
@@ -79,5 +268,73 @@ render_parser.add_argument('--topbar-size', dest='topbar_size', type=int)
 render_parser.add_argument('--topbar-width', dest='topbar_width', type=int)
 render_parser.add_argument('--step-time', dest='step_time', type=float)
 render_parser.add_argument('--gen-time', dest='gen_time', type=float)
+render_parser.add_argument('--video', metavar='FILE', type=Path, help='encode the frames to a video file')
+render_parser.add_argument('--codec', help='FourCC of the video codec, mp4v by default')
+render_parser.add_argument('--fps', type=float)
+render_parser.add_argument('--frames-per-generation', dest='frames_per_generation', type=int,
+                           help='sample or repeat steps so every generation lasts this many video frames')
+render_parser.add_argument('--clip-per-generation', dest='clip_per_generation', action='store_true', default=None,
+                           help='write every generation to its own FILE.<generation> clip')
+render_parser.add_argument('--generations', metavar='A:B[:STRIDE]', type=valid_slice,
+                           help='generations to render, --generations=-A: counts from the end of an indexed recording')
+render_parser.add_argument('--steps', metavar='A:B[:STRIDE]', type=valid_slice,
+                           help='steps of every generation to render, 0 being the initial positions')
+render_parser.add_argument('--mode', choices=('circles', 'density', 'trails'),
+                           help='draw every entity, or a heatmap of occupancy over the generation or of fading trails')
+render_parser.add_argument('--trail-decay', dest='trail_decay', type=float,
+                           help='share of the trails left after a step, 0.9 by default')
+render_parser.add_argument('--full-redraw', dest='incremental', action='store_false', default=None,
+                           help='draw every frame from scratch instead of redrawing the cells entities moved between')
+render_parser.add_argument('-j', '--jobs', type=int,
+                           help='render offline in worker processes, each taking a range of generations. '
+                                '0 uses the CPU count')
+
+index_parser = subparsers.add_parser('index')
+index_parser.set_defaults(func=index)
+index_parser.add_argument('-i', '--input', dest='filename', required=True, metavar='FILE', type=valid_file)
+index_parser.add_argument('--span', type=float, default=4, help='MB of uncompressed data between restart points')
+
+transcode_parser = subparsers.add_parser('transcode', help='convert a V0 recording to block compressed V1')
+transcode_parser.set_defaults(func=transcode)
+transcode_parser.add_argument('-i', '--input', dest='filename', required=True, metavar='FILE', type=valid_file)
+transcode_parser.add_argument('-o', '--output', dest='out_filename', required=True, metavar='FILE', type=Path)
+transcode_parser.add_argument('--compression', choices=tuple(COMPRESSIONS), default='zlib')
+transcode_parser.add_argument('--level', type=int, default=-1, help='compression level, -1 for the default')
+transcode_parser.add_argument('-j', '--jobs', type=int, help='worker processes, defaults to the CPU count')
+transcode_parser.add_argument('--verify', action='store_true', help='read the output back in parallel and compare')
+
+analyze_parser = subparsers.add_parser('analyze', help='compute statistics of a recording without rendering it')
+analyze_parser.set_defaults(func=analyze)
+analyze_parser.add_argument('-i', '--input', dest='filename', required=True, metavar='FILE', type=valid_path,
+                            help='recording file or directory of segments')
+analyze_parser.add_argument('-o', '--output', dest='out_path', required=True, metavar='PATH', type=Path,
+                            help='output path, the .npz and .csv suffixes are added')
+analyze_parser.add_argument('-j', '--jobs', type=int, help='worker processes for segments, defaults to the CPU count')
+analyze_parser.add_argument('--follow', action='store_true',
+                            help='keep analyzing segments of a running simulation until it finishes')
+
+networks_parser = subparsers.add_parser('networks', help='render the neural networks of a generation as diagrams')
+networks_parser.set_defaults(func=networks)
+networks_parser.add_argument('-i', '--input', dest='filename', required=True, metavar='FILE', type=valid_file)
+networks_parser.add_argument('-g', '--generation', type=int, required=True)
+networks_parser.add_argument('-o', '--output', dest='out_dir', required=True, metavar='DIR', type=Path,
+                             help='directory of <generation>-<entity>.png diagrams')
+networks_selection = networks_parser.add_mutually_exclusive_group()
+networks_selection.add_argument('--top', type=int, metavar='N', help='the N best survivors instead of all of them')
+networks_selection.add_argument('--distinct', action='store_true',
+                                help='one entity of every topology in the generation instead of the survivors')
+networks_parser.add_argument('-j', '--jobs', type=int, help='worker processes, defaults to the CPU count')
+
+sweep_parser = subparsers.add_parser('sweep', help='run configurations over a grid or random search of parameters')
+sweep_parser.set_defaults(func=sweep)
+sweep_parser.add_argument('-s', '--spec', required=True, metavar='FILE', type=valid_file,
+                          help='YAML sweep spec, see evolution_simulator.sweep.SweepSpec')
+sweep_parser.add_argument('-o', '--output', dest='out_path', required=True, metavar='FILE', type=Path,
+                          help='CSV results, a sweep writing to an existing one skips the runs it holds')
+sweep_parser.add_argument('-c', '--config', metavar='FILE', type=valid_file,
+                          help='YAML parameters the spec overrides, the bundled config.yml by default')
+sweep_parser.add_argument('-j', '--jobs', type=int, help='worker processes, defaults to the CPU count')
 
-renderer_argnames = ('out_dir', 'show_frames', 'frame_size', 'topbar_size', 'topbar_width', 'step_time', 'gen_time')
+renderer_argnames = ('out_dir', 'show_frames', 'frame_size', 'topbar_size', 'topbar_width', 'step_time', 'gen_time',
+                     'video', 'codec', 'fps', 'frames_per_generation', 'clip_per_generation', 'generations', 'steps',
+                     'mode', 'trail_decay', 'incremental')
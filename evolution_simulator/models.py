@@ -15,8 +15,7 @@ class Direction(Enum):  # uint3
     NE = 8
 
     def as_normalized_coord(self):
-        d = self.value
-        return Coord((d % 3) - 1, trunc(d / 3) - 1)
+        return self.offset
 
     def rotate(self, n=0):
         return rotations[self.value * 8 + (n & 7)]
@@ -55,6 +54,9 @@ coord_to_dir = (S, C, SW, N, SE, E, N, N, N, N, W, NW, N, NE, N, N)
 
 
 class Coord:
+    # Coords are never changed in place, so the unit ones are shared
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -75,7 +77,14 @@ class Coord:
     def length(self):
         return sqrt(self.x * self.x + self.y * self.y)
 
+    @classmethod
+    def unit(cls, x, y):
+        # The shared Coord of an offset of -1, 0 or 1 on both axes
+        return unit_coords[(y + 1) * 3 + x + 1]
+
     def as_dir(self):
+        if -1 <= self.x <= 1 and -1 <= self.y <= 1:
+            return unit_dirs[(self.y + 1) * 3 + self.x + 1]
         xp = self.x * tanD + self.y * tanN
         yp = self.y * tanD - self.x * tanN
         return coord_to_dir[(yp > 0) * 8 + (xp > 0) * 4 + (yp > xp) * 2 + (yp >= -xp)]
@@ -90,12 +99,12 @@ class Coord:
             return (self.x * other.x + self.y + other.y) / sqrt(mag)
 
     def visit_neighbourhood(self, grid_x: int, grid_y: int, radius: float, callback):
+        # Calls back with the x and y of every cell, without building a Coord for each
         for dx in range(int(-min(int(radius), self.x)), min(int(radius), (grid_x - self.x) - 1) + 1):
             x = self.x + dx
             extentY = int(sqrt(radius * radius - dx * dx))
             for dy in range(-min(extentY, self.y), min(extentY, (grid_y - self.y) - 1) + 1):
-                y = self.y + dy
-                callback(Coord(x, y))
+                callback(x, self.y + dy)
 
     def __repr__(self):
         return f"{self.__class__.__qualname__}({self.x}, {self.y})"
@@ -107,13 +116,13 @@ class Coord:
 
     def __add__(self, other):
         if isinstance(other, Direction):
-            other = other.as_normalized_coord()
+            other = other.offset
         if isinstance(other, Coord):
             return Coord(self.x + other.x, self.y + other.y)
 
     def __sub__(self, other):
         if isinstance(other, Direction):
-            other = other.as_normalized_coord()
+            other = other.offset
         if isinstance(other, Coord):
             return Coord(self.x - other.x, self.y - other.y)
 
@@ -122,3 +131,11 @@ class Coord:
 
     def __bool__(self):
         return bool(self.x or self.y)
+
+
+# Indexed by (y + 1) * 3 + x + 1, which is also the value of the Direction of the offset
+unit_coords = tuple(Coord((d % 3) - 1, trunc(d / 3) - 1) for d in range(9))
+unit_dirs = tuple(coord_to_dir[(yp > 0) * 8 + (xp > 0) * 4 + (yp > xp) * 2 + (yp >= -xp)]
+                  for xp, yp in ((c.x * tanD + c.y * tanN, c.y * tanD - c.x * tanN) for c in unit_coords))
+for direction in Direction:
+    direction.offset = unit_coords[direction.value]
@@ -1,5 +1,6 @@
 import os
 import typing as t
+from dataclasses import dataclass, fields
 from os.path import join
 
 import yaml
@@ -24,7 +25,8 @@ def _make_vector_node(vector):
 yaml.SafeLoader.add_constructor("!SELECTION_PRESSURE", _make_vector_node(selection_pressures))
 
 with open(join(os.path.dirname(__file__), "config.yml"), encoding="UTF-8") as f:
-    _CONFIG_YAML = yaml.safe_load(f)
+    _CONFIG_TEXT = f.read()
+    _CONFIG_YAML = yaml.safe_load(_CONFIG_TEXT)
 
 
 class YAMLGetter(type):
@@ -34,7 +36,7 @@ class YAMLGetter(type):
         try:
             sections = cls.section.split(".")
             sections.append(name)
-            end_section = _CONFIG_YAML
+            end_section = cls.__dict__.get('config', _CONFIG_YAML)
             for section in sections:
                 end_section = end_section[section]
             return end_section
@@ -53,6 +55,8 @@ class YAMLGetter(type):
 
 
 class Parameters:
+    config_text = _CONFIG_TEXT
+
     class World(metaclass=YAMLGetter):
         section = "world"
 
@@ -73,8 +77,146 @@ class Parameters:
 
         genome_length: int
         max_hidden_neurons: int
-        responsiveness_curve_kfactor: float
+        responsiveness_curve_kfactor: int
         choose_parents_by_fitness: bool
         sexual_reproduction: bool
         point_mutation_rate: float
         genetic_difference_algorithm: int
+
+
+def parameters_from_config(config_text: str) -> t.Type[Parameters]:
+    config = yaml.safe_load(config_text)
+    sections = {
+        name: YAMLGetter(name, (section,), {'config': config, '__annotations__': section.__annotations__})
+        for name, section in vars(Parameters).items() if isinstance(section, YAMLGetter)
+    }
+    return type(Parameters.__name__, (Parameters,), {'config_text': config_text, **sections})
+
+
+def override_config(config_text: str, overrides: t.Dict[str, t.Any]) -> str:
+    """Replace values of a config given by section.name keys, keeping the tags of the values it replaces."""
+    root = yaml.compose(config_text, yaml.SafeLoader)
+    for key, value in overrides.items():
+        *sections, name = key.lower().split('.')
+        node = root
+        for part in (*sections, name):
+            for item, (key_node, value_node) in enumerate(node.value):
+                if key_node.value == part:
+                    break
+            else:
+                raise KeyError(f'{key} is not in the config')
+            parent, node = node, value_node
+        replacement = yaml.compose(yaml.safe_dump(value), yaml.SafeLoader)
+        if node.tag.startswith('!'):
+            replacement.tag = node.tag
+        parent.value[item] = key_node, replacement
+    return yaml.serialize(root, Dumper=yaml.SafeDumper)
+
+
+def load_parameters(config_text: str = None) -> 'ParameterSnapshot':
+    return compile_parameters(Parameters if config_text is None else parameters_from_config(config_text))
+
+
+@dataclass(frozen=True, slots=True)
+class WorldParameters:
+    grid_x: int
+    grid_y: int
+    entity_count: int
+
+
+@dataclass(frozen=True, slots=True)
+class SimulationParameters:
+    selection_pressure: t.Tuple[t.Type[SelectionPressure], t.Tuple]
+    steps_per_generation: int
+    long_probe_distance: int
+    population_sensor_radius: float
+
+
+@dataclass(frozen=True, slots=True)
+class EntitiesParameters:
+    genome_length: int
+    max_hidden_neurons: int
+    responsiveness_curve_kfactor: int
+    choose_parents_by_fitness: bool
+    sexual_reproduction: bool
+    point_mutation_rate: float
+    genetic_difference_algorithm: int
+
+
+@dataclass(frozen=True, slots=True)
+class ParameterSnapshot:
+    """The parameters of one run, read from the config once and checked up front.
+
+    Sections are plain attributes, so lookups in the simulation loop do not walk the YAML like the Parameters sections.
+    """
+    World: WorldParameters
+    Simulation: SimulationParameters
+    Entities: EntitiesParameters
+    config_text: str
+
+
+SECTIONS = {'World': WorldParameters, 'Simulation': SimulationParameters, 'Entities': EntitiesParameters}
+
+# Inclusive bounds, mostly the widths of the recording header fields
+RANGES = {
+    'grid_x': (2, 255),
+    'grid_y': (2, 255),
+    'entity_count': (1, 0xFFFF),
+    'steps_per_generation': (1, 0x3FF),
+    'long_probe_distance': (1, 0xFF),
+    'population_sensor_radius': (0.1, 6.3),
+    'genome_length': (1, 0x7F),
+    'max_hidden_neurons': (1, 0x3F),
+    'responsiveness_curve_kfactor': (0, 0xF),
+    'point_mutation_rate': (0, 1),
+    'genetic_difference_algorithm': (0, 2),
+}
+
+# Fractional values recorded as int(value * scale) in a header field of this many bits
+SCALED = {
+    'point_mutation_rate': (1024, 10),
+    'population_sensor_radius': (10, 6),
+}
+
+
+def check_parameter(section: str, name: str, kind, value):
+    if kind is bool:
+        valid = isinstance(value, bool)
+    elif kind is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif kind is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        pressure, data = value
+        valid = isinstance(pressure, type) and issubclass(pressure, SelectionPressure)
+    if not valid:
+        raise TypeError(f'{section.lower()}.{name} should be {getattr(kind, "__name__", "a selection pressure")}, '
+                        f'got {value!r}')
+    if name in RANGES and not RANGES[name][0] <= value <= RANGES[name][1]:
+        raise ValueError(f'{section.lower()}.{name} should be between {RANGES[name][0]} and {RANGES[name][1]}, '
+                         f'got {value!r}')
+    if name in SCALED and int(value * SCALED[name][0]) >= 1 << SCALED[name][1]:
+        raise ValueError(f'{section.lower()}.{name} {value!r} does not fit the recording header, which holds it as '
+                         f'int(value * {SCALED[name][0]}) in {SCALED[name][1]} bits')
+
+
+def compile_parameters(parameters: t.Type[Parameters] | ParameterSnapshot = Parameters) -> ParameterSnapshot:
+    if isinstance(parameters, ParameterSnapshot):
+        return parameters
+
+    sections = {}
+    for section, snapshot_type in SECTIONS.items():
+        getter = getattr(parameters, section)
+        values = {}
+        for field in fields(snapshot_type):
+            value = getattr(getter, field.name)
+            check_parameter(section, field.name, field.type, value)
+            if field.name == 'selection_pressure':
+                value = value[0], tuple(value[1])
+            values[field.name] = value
+        sections[section] = snapshot_type(**values)
+
+    world = sections['World']
+    if world.entity_count > world.grid_x * world.grid_y:
+        raise ValueError(f'{world.entity_count} entities do not fit a {world.grid_x}x{world.grid_y} grid')
+    return ParameterSnapshot(**sections, config_text=parameters.config_text)
@@ -1,15 +1,22 @@
+import sys
 import typing as t
 from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
 from time import perf_counter
 
 import cv2 as cv
 import numpy as np
 from numpy.random import default_rng
 
+from .heatmap import MODES, TRAIL_DECAY, Heatmap
 from .selection_pressure import selection_pressure_renderers
-from ...serializer.serializer import Coord, SerializerBase
+from .video import CODEC, FPS, VideoSink, frame_repeats
+from ...serializer.packing import unpack_actions
+from ...serializer.serializer import SerializerBase
+from ...serializer.stream import Generation
 
-prng = default_rng(42)
+COLOUR_SEED = 42
 
 FRAME_SIZE = 900
 
@@ -19,15 +26,60 @@ TOP_BAR_WIDTH = 4
 STEP_TIME = 0
 GEN_TIME = 0
 
+PREFETCH_STEPS = 64
+PREFETCH_FRAMES = 8
+IDLE_WAIT = 0.1
+STOP_POLL = 0.1
+
+# A circle covers its own cell and reaches into these, as (x, y) offsets
+SPILL = np.array([(0, 0), (1, 0), (0, 1), (1, 1)], np.intp)
+
+# Generations to move by, within the selected ones
+SEEK_KEYS = {ord('.'): 1, ord(','): -1, ord('>'): 10, ord('<'): -10}
+
+
+class FrameData(t.NamedTuple):
+    generation: int
+    survivors: int
+    step: int
+    positions: np.ndarray
+    hold: float
+    epoch: int
+    generation_end: bool = False
+
+
+class Frame(t.NamedTuple):
+    image: np.ndarray
+    generation: int
+    hold: float
+    epoch: int
+
+
+def select_generations(generations: slice | range | None, count: int | None) -> range | None:
+    # None plays a stream as it comes, an open ended selection of a stream is read until it ends
+    if generations is None:
+        return range(count) if count is not None else None
+    if isinstance(generations, range):
+        return generations
+    if count is not None:
+        return range(*generations.indices(count))
+    if (generations.start or 0) < 0 or (generations.stop or 0) < 0 or (generations.step or 1) < 0:
+        raise ValueError('selecting generations from the end needs an indexed recording')
+    return range(generations.start or 0, generations.stop or sys.maxsize, generations.step or 1)
+
 
 # noinspection PyUnresolvedReferences
 class Renderer:
     def __init__(self, deserializer: SerializerBase.Deserializer, show_frames=True, out_dir: Path = None,
                  frame_size=FRAME_SIZE, topbar_size=TOP_BAR_SIZE, topbar_width=TOP_BAR_WIDTH,
-                 step_time=STEP_TIME, gen_time=GEN_TIME):
+                 step_time=STEP_TIME, gen_time=GEN_TIME, video: Path = None, codec=CODEC, fps=FPS,
+                 frames_per_generation: int = None, clip_per_generation=False, generations: slice | range = None,
+                 steps: slice = None, mode='circles', trail_decay=TRAIL_DECAY, incremental=True):
         assert deserializer.params.grid.x == deserializer.params.grid.y
-        self.ssss = perf_counter()
+        if mode not in MODES:
+            raise ValueError(f'unknown render mode {mode}, expected one of {", ".join(MODES)}')
         self.deserializer = deserializer
+        self.mode = mode
 
         self.show_frames = show_frames
         self.out_dir = out_dir
@@ -53,11 +105,18 @@ class Renderer:
 
         self.circle_radius = int(self.frame_size / self.deserializer.params.grid.x / 2)
         self.circle_diameter = 2 * self.circle_radius
+        self.incremental = incremental
+        self.previous_frame = self.previous_positions = self.previous_generation = None
+        self.heatmap = None
+        if mode != 'circles':
+            self.heatmap = Heatmap(self.deserializer.params.grid.x, self.frame_size, mode, trail_decay)
+        elif not self.circle_radius:
+            raise ValueError(f'a {self.deserializer.params.grid.x} cell grid does not fit {self.frame_size} pixels as '
+                             f'circles, render it with a larger frame size or the density or trails mode')
 
         self.y_offset = self.topbar_size + self.topbar_width + self.circle_radius
 
         self.img_base = np.full((self.frame_height, self.frame_width, 3), 255, np.uint8)
-        self.img = None
         cv.line(self.img_base, (0, self.topbar_size), (self.frame_width, self.topbar_size), (0, 0, 0),
                 self.topbar_width)
 
@@ -77,48 +136,224 @@ class Renderer:
         cv.putText(self.img_base, text, (int(self.half_frame_width - (text_width / 2)), self.text_upper),
                    cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 1, cv.LINE_AA, False)
 
-        self.actual_width = self.circle_diameter * self.deserializer.params.grid.x
-        self.actual_height = self.circle_diameter * self.deserializer.params.grid.y
+        if self.heatmap is not None:
+            self.actual_width = self.actual_height = self.heatmap.size
+        else:
+            self.actual_width = self.circle_diameter * self.deserializer.params.grid.x
+            self.actual_height = self.circle_diameter * self.deserializer.params.grid.y
         self.half_actual_width = int(self.actual_width / 2)
         self.half_actual_height = int(self.actual_height / 2)
 
+        self.grid_top = self.topbar_size + self.topbar_width
+        grid_shape = self.deserializer.params.grid.y, self.deserializer.params.grid.x
+        self.cell_colours = np.zeros((*grid_shape, 3), np.uint8)
+        self.cell_occupied = np.zeros(grid_shape, np.uint8)
+        self.cell_entities = np.full((grid_shape[0] + 1, grid_shape[1] + 1), -1, np.intp)
+        self.cell_dirty = np.zeros(self.cell_entities.shape, bool)
+        if self.heatmap is None:
+            self.sprite_mask, self.sprite_tiles, self.sprite_rows, self.sprite_cols = self.circle_sprite()
+            edge = (self.sprite_rows == self.circle_diameter) | (self.sprite_cols == self.circle_diameter)
+            self.sprite_edge_rows, self.sprite_edge_cols = self.sprite_rows[edge], self.sprite_cols[edge]
+
+        self.video = None
+        if video is not None:
+            self.video = VideoSink(video, (self.frame_width, self.frame_height), codec, fps, clip_per_generation)
+        # Step 0 is the initial positions, by default the first frame shows the first step
+        step_count = self.deserializer.params.generationSteps
+        self.steps = range(1, step_count + 1) if steps is None else range(*steps.indices(step_count + 1))
+        if not self.steps:
+            raise ValueError(f'no steps selected, generations have {step_count} steps')
+        self.frame_repeats = None
+        if frames_per_generation is not None:
+            self.frame_repeats = dict(zip(self.steps, frame_repeats(len(self.steps), frames_per_generation)))
+
         self.selection_pressure_renderer = selection_pressure_renderers.get(deserializer.selection_pressure.__class__)(
             self
         )
-        self.img_base = self.selection_pressure_renderer.render(self.img_base)
+        if self.heatmap is None:
+            self.img_base = self.selection_pressure_renderer.render(self.img_base)
 
-        self.entity_colours: t.Dict[int, tuple[int, int, int]] = {}
-        self.entity_positions: t.List[Coord] = []
+        self.entity_colours = np.empty((0, 3), np.uint8)
+        self.entity_positions = np.empty((0, 2), np.int16)
 
+        self.generations = select_generations(generations, deserializer.generation_count)
+        self.generations_read = 0
         self.generation = -1
         self.step = self.deserializer.params.generationSteps
         self.survivors = 0
 
-        self.finished = False
-        self.wait_time = self.gen_time
-        self.gen = True
+        self.step_queue: Queue[FrameData | None] = Queue(PREFETCH_STEPS)
+        self.frame_queue: Queue[Frame | None] = Queue(PREFETCH_FRAMES)
+        self.stopped = Event()
+        self.error: Exception | None = None
+        self.dropped = 0
+
+        # A seek is requested by the display and carried out by the decoder, frames of an older epoch are dropped
+        self.seek_lock = Lock()
+        self.seek_request: int | None = None
+        self.epoch = 0
+        self.shown_generation: int | None = None
 
     def get_text_size(self, text, scale=1):
-        text_len = len(text)
-        if text_len not in self.text_sizes:
-            value = self.text_sizes[text_len] = cv.getTextSize(text, cv.FONT_HERSHEY_SIMPLEX, scale, cv.LINE_AA)[0]
+        # Keyed by the text, texts of the same length can differ in width
+        if text not in self.text_sizes:
+            value = self.text_sizes[text] = cv.getTextSize(text, cv.FONT_HERSHEY_SIMPLEX, scale, cv.LINE_AA)[0]
         else:
-            value = self.text_sizes[text_len]
+            value = self.text_sizes[text]
         return value, text
 
-    def set_entity_colours(self):
-        for i in range(self.deserializer.params.entityCount):
-            self.entity_colours[i] = (int(prng.integers(256)), int(prng.integers(256)), int(prng.integers(256)))
+    def set_entity_colours(self, generation: int):
+        # Colours depend on the generation only, whichever generation rendering starts from
+        shape = self.deserializer.params.entityCount, 3
+        self.entity_colours = default_rng((COLOUR_SEED, generation)).integers(256, size=shape).astype(np.uint8)
+
+    def read_stats(self):
+        if self.generations is not None:
+            if self.generations_read >= len(self.generations):
+                return None
+            generation = self.generations[self.generations_read]
+            if generation != self.deserializer.generation:
+                self.deserializer.seek_generation(generation)
+            self.generations_read += 1
+        return self.deserializer.next_generation()
+
+    def request_seek(self, delta: int):
+        if self.shown_generation is None:
+            return  # nothing shown to seek from yet
+        with self.seek_lock:
+            position = self.seek_request
+            if position is None:
+                position = self.generations.index(self.shown_generation)
+            self.seek_request = min(max(position + delta, 0), len(self.generations) - 1)
+            self.epoch += 1
+
+    def take_seek(self) -> t.Tuple[int | None, int]:
+        with self.seek_lock:
+            position, self.seek_request = self.seek_request, None
+            return position, self.epoch
+
+    def step_positions(self, generation: Generation) -> t.Iterator[t.Tuple[int, np.ndarray]]:
+        # The first selected step from the closest position keyframe, the following ones from the steps in between
+        packed = None
+        previous = None
+        for step in self.steps:
+            if previous is None or step <= previous:
+                positions = generation.positions_at(step)
+            else:
+                packed = generation.packed_steps() if packed is None else packed
+                positions = positions + unpack_actions(packed[previous:step], generation.entity_count).sum(
+                    axis=0, dtype=np.int16)
+            previous = step
+            yield step, positions
+
+    def circle_sprite(self):
+        # A filled circle drawn by cv, so stamps match cv.circle exactly. It covers one pixel more than its grid cell,
+        # the cell sized part is tiled over the whole grid and the pixels on the far edges are stamped separately.
+        diameter = self.circle_diameter
+        sprite = np.zeros((diameter + 1, diameter + 1), np.uint8)
+        cv.circle(sprite, (self.circle_radius, self.circle_radius), self.circle_radius, 255, -1)
+        mask = sprite[:diameter, :diameter]
+        tiles = np.tile(mask, (self.deserializer.params.grid.y, self.deserializer.params.grid.x))
+        rows, cols = np.nonzero(sprite)
+        return mask.astype(bool), tiles, rows, cols
 
     def draw_circle_at(self, img, grid_x, grid_y, colour):
         cv.circle(img, (
             self.circle_radius + (self.circle_diameter * grid_x), self.y_offset + (self.circle_diameter * grid_y)),
                   self.circle_radius, colour, -1)
 
+    def draw_entities(self, img):
+        diameter = self.circle_diameter
+        grid_x = self.entity_positions[:, 0].astype(np.intp)
+        grid_y = self.entity_positions[:, 1].astype(np.intp)
+        entities = np.arange(len(grid_x))
+
+        # Every cell gets the colour of its entity, scaled up to pixels and masked by the tiled sprite
+        self.cell_colours[grid_y, grid_x] = self.entity_colours
+        self.cell_occupied[grid_y, grid_x] = 255
+        size = self.actual_width, self.actual_height
+        colours = cv.resize(self.cell_colours, size, interpolation=cv.INTER_NEAREST_EXACT)
+        covered = cv.resize(self.cell_occupied, size, interpolation=cv.INTER_NEAREST_EXACT)
+        cv.bitwise_and(covered, self.sprite_tiles, covered)
+        cv.copyTo(colours, covered, img[self.grid_top:self.grid_top + self.actual_height, :self.actual_width])
+
+        # Edge pixels land in the neighbouring cell, whose circle is drawn over them if it belongs to a later entity.
+        # The cells keep their entities for update_entities.
+        self.cell_entities.fill(-1)
+        self.cell_entities[grid_y, grid_x] = entities
+        rows = grid_y[:, None] * diameter + self.sprite_edge_rows
+        cols = grid_x[:, None] * diameter + self.sprite_edge_cols
+        owners = self.cell_entities[rows // diameter, cols // diameter]
+        draw = (owners < entities[:, None]) | ~self.sprite_mask[rows % diameter, cols % diameter]
+        draw &= (rows + self.grid_top < self.frame_height) & (cols < self.frame_width)
+        img[rows[draw] + self.grid_top, cols[draw]] = self.entity_colours[np.nonzero(draw)[0]]
+
+        self.cell_colours[grid_y, grid_x] = 0
+        self.cell_occupied[grid_y, grid_x] = 0
+
+    def update_entities(self, img, previous: np.ndarray):
+        # Redraws only what the entities that moved since previous have touched. A circle reaches one pixel into the
+        # cells right and below its own, so those are restored from img_base too, then every circle reaching any of
+        # the restored cells is stamped again. Where circles overlap the later entity wins, as in draw_entities.
+        diameter = self.circle_diameter
+        moved = np.nonzero((previous != self.entity_positions).any(axis=1))[0]
+        if not len(moved):
+            return
+        old = previous[moved].astype(np.intp)
+        new = self.entity_positions[moved].astype(np.intp)
+        self.cell_entities[old[:, 1], old[:, 0]] = -1
+        self.cell_entities[new[:, 1], new[:, 0]] = moved
+
+        width = self.cell_entities.shape[1]
+        dirty = np.concatenate((old, new))
+        cells = np.unique(((dirty[:, None] + SPILL) * (1, width)).sum(axis=2))
+        cells_x, cells_y = cells % width, cells // width
+        self.cell_dirty[cells_y, cells_x] = True
+
+        span = np.arange(diameter)
+        shape = len(cells), diameter, diameter
+        rows = np.broadcast_to(cells_y[:, None, None] * diameter + span[:, None] + self.grid_top, shape).ravel()
+        cols = np.broadcast_to(cells_x[:, None, None] * diameter + span, shape).ravel()
+        inside = (rows < self.frame_height) & (cols < self.frame_width)
+        img[rows[inside], cols[inside]] = self.img_base[rows[inside], cols[inside]]
+
+        reaching = np.unique(((np.stack((cells_x, cells_y), axis=1)[:, None] - SPILL) * (1, width)).sum(axis=2))
+        reaching = reaching[reaching >= 0]
+        entities = self.cell_entities.ravel()[reaching]
+        entities = np.sort(entities[entities >= 0])
+        grid_x = self.entity_positions[entities, 0].astype(np.intp)
+        grid_y = self.entity_positions[entities, 1].astype(np.intp)
+        rows = (grid_y[:, None] * diameter + self.sprite_rows).ravel()
+        cols = (grid_x[:, None] * diameter + self.sprite_cols).ravel()
+        owners = np.repeat(entities, len(self.sprite_rows))
+        stamp = self.cell_dirty[rows // diameter, cols // diameter]
+        stamp &= (rows + self.grid_top < self.frame_height) & (cols < self.frame_width)
+        rows, cols, owners = rows[stamp][::-1], cols[stamp][::-1], owners[stamp][::-1]
+        _, last = np.unique(rows * self.frame_width + cols, return_index=True)
+        img[rows[last] + self.grid_top, cols[last]] = self.entity_colours[owners[last]]
+
+        self.cell_dirty[cells_y, cells_x] = False
+
+    def draw_heatmap(self, img):
+        # The selection pressure is drawn over the heatmap, not into img_base where it would be hidden
+        grid = img[self.grid_top:self.grid_top + self.actual_height, :self.actual_width]
+        grid[:] = self.heatmap.image()
+        self.selection_pressure_renderer.render(img)
+
     def draw_frame(self):
-        img = self.img_base.copy()
-        for i, pos in enumerate(self.entity_positions):
-            self.draw_circle_at(img, pos.x, pos.y, self.entity_colours[i])
+        if self.heatmap is not None:
+            img = self.img_base.copy()
+            self.draw_heatmap(img)
+        elif self.incremental and self.previous_frame is not None and self.previous_generation == self.generation:
+            # Frames are queued, so the previous one is copied rather than drawn over
+            img = self.previous_frame.copy()
+            img[:self.grid_top] = self.img_base[:self.grid_top]
+            self.update_entities(img, self.previous_positions)
+        else:
+            img = self.img_base.copy()
+            self.draw_entities(img)
+        self.previous_frame, self.previous_positions, self.previous_generation = \
+            img, self.entity_positions, self.generation
 
         (width, _), text = self.get_text_size(f'Generation: {self.generation + 1}')
         cv.putText(img, text, (int(self.bottom_text_locations[0] - (width / 2)), self.text_lower),
@@ -128,53 +363,151 @@ class Renderer:
                    cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 1, cv.LINE_AA, False)
         return img
 
-    def run(self):
-        self.gen = True
-
-        start = perf_counter() - self.wait_time
+    def put(self, queue: Queue, item) -> bool:
+        # Blocks while the queue is full, unless the viewer quits in the meantime
+        while not self.stopped.is_set():
+            try:
+                queue.put(item, timeout=STOP_POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def get(self, queue: Queue):
+        while not self.stopped.is_set():
+            try:
+                return queue.get(timeout=STOP_POLL)
+            except Empty:
+                pass
+        return None
+
+    def decode(self):
+        # Waiting at the end only makes sense when there is something to seek back to
+        seekable = self.show_frames and self.generations is not None
+        epoch = 0
+        try:
+            while not self.stopped.is_set():
+                position, seek_epoch = self.take_seek()
+                if position is not None:
+                    self.generations_read = position
+                    epoch = seek_epoch
+
+                stats = self.read_stats()
+                if stats is None:
+                    print('\nFinished')
+                    if not seekable:
+                        break
+                    while not self.stopped.wait(STOP_POLL) and self.seek_request is None:
+                        pass
+                    continue
+                # Live streams can skip generations
+                generation = Generation(self.deserializer, self.deserializer.generation, stats)
+                print(f"\nGeneration: {generation.number}")
+
+                positions = None
+                for step, positions in self.step_positions(generation):
+                    if self.seek_request is not None:
+                        break
+                    print(f'\tStep: {step}', end='\r')
+                    if not self.put(self.step_queue, FrameData(generation.number, generation.survivors, step,
+                                                               positions, self.step_time, epoch)):
+                        return
+                else:
+                    # The last step once more, held for the pause between generations
+                    if not self.put(self.step_queue, FrameData(generation.number, generation.survivors, step,
+                                                               positions, self.gen_time, epoch, True)):
+                        return
+                if not generation.loaded:
+                    self.deserializer.skip_payload()
+                generation.expired = True
+                self.deserializer.skip_stats()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.put(self.step_queue, None)
+
+    def rasterize(self):
+        try:
+            while (data := self.get(self.step_queue)) is not None:
+                if data.generation != self.generation:
+                    self.generation = data.generation
+                    self.set_entity_colours(self.generation)
+                    if self.heatmap is not None:
+                        self.heatmap.reset()
+                self.survivors, self.step, self.entity_positions = data.survivors, data.step, data.positions
+                if self.heatmap is not None and not data.generation_end:
+                    self.heatmap.add(self.entity_positions)
+
+                img = self.draw_frame()
+                if self.save_frames:
+                    cv.imwrite(str(self.out_dir / f"{self.generation}-{self.step}.jpg"), img)
+                if self.video is not None and not data.generation_end:
+                    self.video.write(img, self.generation,
+                                     1 if self.frame_repeats is None else self.frame_repeats[self.step])
+                if self.show_frames and not self.put(self.frame_queue,
+                                                     Frame(img, data.generation, data.hold, data.epoch)):
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self.put(self.frame_queue, None)
+
+    def show_next(self, due: float) -> float | None:
+        # Shows the next frame and returns when the one after it is due, or None at the end. Every frame is due when
+        # the one before it has been held for its time. A frame whose time has passed while a later one is ready is
+        # dropped, so a slow display keeps the pace of the recording.
         while True:
-            if not self.finished:
-                now = perf_counter()
-                if now - start >= self.wait_time:
-                    if self.gen:
-                        self.gen = False
-                        self.wait_time = self.step_time
-
-                        self.generation += 1
-
-                        stats = self.deserializer.read_stats()
-                        if stats is None:
-                            self.finished = True
-                            print('\nFinished')
-                            # return perf_counter() - self.ssss
-                            continue
-                        self.survivors, *_ = stats
-                        self.deserializer.read_genomes()
-                        self.entity_positions = self.deserializer.read_initial_pos()
-                        print(f"\nGeneration: {self.generation}")
-
-                        self.set_entity_colours()
-
-                        self.step = 0
-
-                    if self.step == self.deserializer.params.generationSteps:
-                        self.gen = True
-                        self.wait_time = self.gen_time
-                        self.deserializer.skip_stats()
-                    else:
-                        self.step += 1
-                        print(f'\tStep: {self.step}', end='\r')
-                        actions = self.deserializer.read_step()
-                        for i, action in enumerate(actions):
-                            if action:
-                                self.entity_positions[i] += action
-
-                    self.img = self.draw_frame()
-                    if self.save_frames:
-                        cv.imwrite(str(self.out_dir / f"{self.generation}-{self.step}.jpg"), self.img)
-                    start = perf_counter()
-            if self.show_frames:
-                cv.imshow('frame', self.img)
+            now = perf_counter()
+            try:
+                frame = self.frame_queue.get_nowait()
+            except Empty:
+                return now  # waiting on the decoder, not late
+            if frame is None:
+                return None
+            if frame.epoch != self.epoch:
+                due = now  # drawn before a seek, the clock starts again with the frames after it
+                continue
+            if frame.hold and now >= due + frame.hold and not self.frame_queue.empty():
+                self.dropped += 1
+                due += frame.hold
+                continue
+            cv.imshow('frame', frame.image)
+            self.shown_generation = frame.generation
+            return due + frame.hold
+
+    def display(self):
+        # Streams and recordings without an index play straight through, the seek keys are only bound for the others
+        seek_keys = SEEK_KEYS if self.deserializer.generation_count is not None else {}
+        due = perf_counter()
+        while self.error is None:  # a failed decoder or rasterizer is raised by run, not left as a frozen frame
+            if due is not None and perf_counter() >= due:
+                due = self.show_next(due)
+            wait = IDLE_WAIT if due is None else min(max(due - perf_counter(), 0.001), IDLE_WAIT)
+            key = cv.waitKey(max(int(wait * 1000), 1))
+            if key == ord('q'):
+                break
+            if key in seek_keys:
+                self.request_seek(seek_keys[key])
 
-                if cv.waitKey(1) == ord('q'):
-                    break
+    def run(self):
+        self.stopped.clear()
+        self.error = None
+        threads = [Thread(target=self.decode, name='decoder', daemon=True),
+                   Thread(target=self.rasterize, name='rasterizer', daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            if self.show_frames:
+                self.display()
+            else:
+                while self.get(self.frame_queue) is not None:
+                    pass
+        finally:
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+            if self.video is not None:
+                self.video.close()
+        if self.error is not None:
+            raise self.error
+        return self.dropped
@@ -0,0 +1,41 @@
+import cv2 as cv
+import numpy as np
+
+MODES = ('circles', 'density', 'trails')
+TRAIL_DECAY = 0.9
+COLOURMAP = cv.COLORMAP_INFERNO
+
+
+class Heatmap:
+    """Entity occupancy of the grid binned to at most one bin per pixel, drawn as a colour mapped image.
+
+    density adds up every step of the generation so far, trails fades the earlier steps by decay each step.
+    """
+
+    def __init__(self, grid_size: int, frame_size: int, mode='density', decay=TRAIL_DECAY):
+        self.grid_size = grid_size
+        self.bins = min(grid_size, frame_size)
+        self.size = frame_size
+        self.mode = mode
+        self.decay = decay
+        self.heat = np.zeros((self.bins, self.bins), np.float32)
+
+    def reset(self):
+        self.heat.fill(0)
+
+    def add(self, positions: np.ndarray):
+        cells = positions.astype(np.intp) * self.bins // self.grid_size
+        occupancy = np.bincount(cells[:, 1] * self.bins + cells[:, 0], minlength=self.heat.size)
+        if self.mode == 'trails':
+            self.heat *= self.decay
+        self.heat += occupancy.reshape(self.heat.shape)
+
+    def image(self) -> np.ndarray:
+        # Log scaled, so a few crowded cells do not wash out the rest
+        scaled = np.log1p(self.heat)
+        if (peak := scaled.max()) > 0:
+            scaled *= 255 / peak
+        image = cv.applyColorMap(scaled.astype(np.uint8), COLOURMAP)
+        if self.bins != self.size:
+            image = cv.resize(image, (self.size, self.size), interpolation=cv.INTER_NEAREST)
+        return image
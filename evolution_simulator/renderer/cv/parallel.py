@@ -0,0 +1,152 @@
+import os
+import tempfile
+import typing as t
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import UnsupportedOperation
+from pathlib import Path
+from time import sleep
+
+import numpy as np
+
+from . import Renderer, select_generations
+from .video import CODEC, FPS, VideoSink
+from ...serializer.serializer import open_deserializer
+
+# Frames per chunk file and chunks a worker may spool ahead of the encoder
+SPOOL_CHUNK_FRAMES = 16
+SPOOL_CHUNKS = 4
+SPOOL_POLL = 0.05
+STOP_MARKER = 'stopped'  # left in the spool directory when the encoder gives up
+
+
+class FrameSpool:
+    """Raw frames written to numbered chunk files by a worker, for the single encoder that stitches the video together.
+
+    Encoding one video stream cannot be split between processes, and any codec that could carry the frames to it
+    costs more to decode than the frames cost to draw. A worker gets at most chunks chunks of chunk_frames frames
+    ahead of the encoder, which deletes every chunk once it has been encoded.
+    """
+
+    def __init__(self, directory: Path, chunk_frames=SPOOL_CHUNK_FRAMES, chunks=SPOOL_CHUNKS):
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        self.chunks = chunks
+        self.buffer: np.ndarray | None = None
+        self.frames = 0
+        self.chunk = 0
+
+    def write(self, frame: np.ndarray, generation: int, repeat=1):
+        if self.buffer is None:
+            self.buffer = np.empty((self.chunk_frames, *frame.shape), frame.dtype)
+        for _ in range(repeat):
+            self.buffer[self.frames] = frame
+            self.frames += 1
+            if self.frames == self.chunk_frames:
+                self.flush()
+
+    def flush(self):
+        # Waits while the encoder has not taken the chunk written that many chunks ago, a chunk only appears complete
+        previous = chunk_path(self.directory, self.chunk - self.chunks)
+        while self.chunk >= self.chunks and previous.exists():
+            if (self.directory.parent / STOP_MARKER).exists():
+                raise InterruptedError('the video encoder stopped')
+            sleep(SPOOL_POLL)
+        partial = self.directory / f'{self.chunk}.partial'
+        with open(partial, 'wb') as f:
+            np.save(f, self.buffer[:self.frames])
+        os.replace(partial, chunk_path(self.directory, self.chunk))
+        self.chunk += 1
+        self.frames = 0
+
+    def close(self):
+        if self.frames:
+            self.flush()
+
+
+def chunk_path(directory: Path, chunk: int) -> Path:
+    return directory / f'{chunk}.npy'
+
+
+def split_generations(count: int, parts: int) -> t.List[range]:
+    bounds = [count * i // parts for i in range(parts + 1)]
+    return [range(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def render_part(path, generations: range, renderer_args: dict, spool: Path = None):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), open_deserializer(path) as deserializer:
+        renderer = Renderer(deserializer, generations=generations, **renderer_args)
+        if spool is not None:
+            renderer.video = FrameSpool(spool)
+        renderer.run()
+
+
+def stitch(spool: Path, future: Future, sink_args: tuple, sink: VideoSink | None, generation: int) -> VideoSink:
+    # Encodes the chunks of one worker in order as they appear, until the worker has finished
+    chunk = 0
+    while True:
+        path = chunk_path(spool, chunk)
+        if path.exists():
+            frames = np.load(path, mmap_mode='r')
+            if sink is None:
+                sink = VideoSink(sink_args[0], frames.shape[2:0:-1], *sink_args[1:])
+            for frame in frames:
+                sink.write(np.array(frame), generation)
+            del frames
+            os.remove(path)
+            chunk += 1
+        elif future.done():
+            future.result()
+            if not path.exists():  # or it was written just before the worker finished
+                return sink
+        else:
+            sleep(SPOOL_POLL)
+
+
+def render_parallel(path, jobs: int = None, video: Path = None, codec=CODEC, fps=FPS, clip_per_generation=False,
+                    **renderer_args) -> int:
+    """Render a recording offline in worker processes, each taking its own range of generations.
+
+    Frames and per generation clips are written by the workers directly. For a single video the workers spool their
+    frames in bounded chunks, which are encoded in order while the workers draw the following ones.
+    """
+    jobs = jobs or os.cpu_count()
+    with open_deserializer(path) as deserializer:
+        if (count := deserializer.generation_count) is None:
+            raise UnsupportedOperation('rendering in parallel needs a generation index, see the index subcommand')
+    selected = select_generations(renderer_args.pop('generations', None), count)
+    renderer_args['show_frames'] = False
+    if renderer_args.get('out_dir') is not None:
+        renderer_args['out_dir'].mkdir(exist_ok=True)
+    ranges = [selected[part.start:part.stop] for part in split_generations(len(selected), jobs)]
+
+    if video is None or clip_per_generation:
+        if video is not None:
+            renderer_args.update(video=video, codec=codec, fps=fps, clip_per_generation=True)
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = [executor.submit(render_part, path, generations, renderer_args) for generations in ranges]
+            for future, generations in zip(futures, ranges):
+                future.result()
+                print(f'Rendered generations {generations[0]} to {generations[-1]}')
+        return len(selected)
+
+    # The workers are joined before their spools are removed
+    with tempfile.TemporaryDirectory(prefix='.render-', dir=video.parent) as directory, \
+            ProcessPoolExecutor(jobs) as executor:
+        sink = None
+        try:
+            spools = [Path(directory) / str(part) for part in range(len(ranges))]
+            futures = []
+            for spool, generations in zip(spools, ranges):
+                spool.mkdir()
+                futures.append(executor.submit(render_part, path, generations, renderer_args, spool))
+            for spool, future, generations in zip(spools, futures, ranges):
+                sink = stitch(spool, future, (video, codec, fps), sink, generations[0])
+                print(f'Rendered generations {generations[0]} to {generations[-1]}')
+        except BaseException:
+            (Path(directory) / STOP_MARKER).touch()  # workers waiting for the encoder give up
+            raise
+        finally:
+            if sink is not None:
+                sink.close()
+    return len(selected)
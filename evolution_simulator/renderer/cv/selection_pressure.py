@@ -142,7 +142,8 @@ class Circle(SelectionPressureRender):
     def __init__(self, renderer):
         super().__init__(renderer)
         half = renderer.half_actual_width
-        radius = renderer.deserializer.selection_pressure.radius * renderer.circle_diameter
+        radius = renderer.deserializer.selection_pressure.radius * renderer.actual_width // \
+            renderer.deserializer.params.grid.x
         diameter = 2 * radius
 
         top_start = renderer.topbar_size + renderer.topbar_width
@@ -155,8 +156,11 @@ class Circle(SelectionPressureRender):
 
         self.circle = np.full((diameter, diameter, 3), 255, dtype=np.uint8)
         cv2.circle(self.circle, (radius, radius), radius, RED, -1)
+        self.mask = np.zeros((diameter, diameter), np.uint8)
+        cv2.circle(self.mask, (radius, radius), radius, 255, -1)
 
     def render(self, img: np.ndarray) -> np.ndarray:
-        img[self.start_y:self.end_y, self.start_x:self.end_x] = cv2.addWeighted(
-            img[self.start_y:self.end_y, self.start_x:self.end_x], 0.8, self.circle, 0.2, 1.0)
+        # Only inside the circle, on a dark heatmap the corners would show
+        area = img[self.start_y:self.end_y, self.start_x:self.end_x]
+        cv2.copyTo(cv2.addWeighted(area, 0.8, self.circle, 0.2, 1.0), self.mask, area)
         return super().render(img)
@@ -0,0 +1,86 @@
+import typing as t
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+
+import cv2 as cv
+import numpy as np
+
+CODEC = 'mp4v'
+FPS = 30
+QUEUE_SIZE = 64
+
+
+def frame_repeats(frames: int, frames_per_generation: int) -> np.ndarray:
+    # How often each frame of a generation is written, so the generation lasts frames_per_generation frames
+    if frames_per_generation < 1:
+        raise ValueError(f'frames per generation must be positive, got {frames_per_generation}')
+    sampled = np.linspace(0, frames - 1, frames_per_generation).round().astype(np.intp)
+    return np.bincount(sampled, minlength=frames)
+
+
+class VideoSink:
+    """Encodes frames with cv.VideoWriter on a background thread, fed through a bounded queue.
+
+    With clip_per_generation every generation goes to its own file next to path, e.g. run.mp4 becomes run.00003.mp4.
+    """
+
+    def __init__(self, path: Path, frame_size: t.Tuple[int, int], codec=CODEC, fps=FPS, clip_per_generation=False,
+                 queue_size=QUEUE_SIZE):
+        if len(codec) != 4:
+            raise ValueError(f'{codec!r} is not a FourCC code')
+        self.path = Path(path)
+        self.frame_size = frame_size
+        self.codec = codec
+        self.fps = fps
+        self.clip_per_generation = clip_per_generation
+
+        self.queue: Queue[t.Tuple[int, np.ndarray] | None] = Queue(queue_size)
+        self.error: Exception | None = None
+        self.frames = 0
+        self.thread = Thread(target=self.encode, name='video encoder', daemon=True)
+        self.thread.start()
+
+    def clip_path(self, generation: int) -> Path:
+        if not self.clip_per_generation:
+            return self.path
+        return self.path.with_name(f'{self.path.stem}.{generation:05d}{self.path.suffix}')
+
+    def open_writer(self, path: Path) -> cv.VideoWriter:
+        writer = cv.VideoWriter(str(path), cv.VideoWriter_fourcc(*self.codec), self.fps, self.frame_size)
+        if not writer.isOpened():
+            raise OSError(f'Cannot write {self.codec} video to {path}')
+        return writer
+
+    def write(self, frame: np.ndarray, generation: int, repeat=1):
+        if self.error is not None:
+            raise self.error
+        for _ in range(repeat):
+            self.queue.put((generation, frame))  # blocks while the encoder is behind
+
+    def encode(self):
+        writer = None
+        current = None
+        while (item := self.queue.get()) is not None:
+            if self.error is not None:
+                continue  # keep draining so the renderer never blocks on a dead encoder
+            generation, frame = item
+            try:
+                if writer is None or (self.clip_per_generation and generation != current):
+                    if writer is not None:
+                        writer.release()
+                    writer = self.open_writer(self.clip_path(generation))
+                    current = generation
+                writer.write(frame)
+                self.frames += 1
+            except Exception as e:
+                self.error = e
+        if writer is not None:
+            writer.release()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
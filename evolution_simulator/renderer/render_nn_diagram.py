@@ -1,9 +1,20 @@
+import os
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from math import isnan
+from pathlib import Path
 
 import igraph
+import numpy as np
 
 from ..entity.entity_io import sensors, actions
-from ..entity.genome import NEURON, SENSOR, ACTION
+from ..entity.genome import NEURON, SENSOR, ACTION, Gene, NeuralNetwork
+from ..selection_pressure import SelectionPressure
+from ..serializer.stream import Generation, iter_generations
+
+if t.TYPE_CHECKING:
+    from ..serializer.serializer import SerializerBase
 
 DEFAULT_DATA = {'size': 35}
 
@@ -47,23 +58,31 @@ LAYOUT_DATA = {
 }
 
 
+def vertex_names(connection, vertex_datadict=None) -> t.Tuple[str, str]:
+    vertex_datadict = vertex_datadict or VERTEX_DATA
+    return (vertex_datadict[0][connection.inputType]['vertex'](connection.inputNum),
+            vertex_datadict[1][connection.outputType]['vertex'](connection.outputNum))
+
+
+def topology(connections, vertex_datadict=None) -> t.Tuple[t.Tuple[str, str], ...]:
+    # The edges of a network whatever their weights and order, networks with the same one are laid out the same
+    return tuple(sorted(vertex_names(connection, vertex_datadict) for connection in connections))
+
+
 def graph_from_nn(connections, vertex_datadict=None):
-    vertices = []
+    vertices = {}
     edges = []
-    done_vertices = []
 
     vertex_datadict = vertex_datadict or VERTEX_DATA
 
     for connection in connections:
         edge = {}
-        data = ((connection.inputType, connection.inputNum), (connection.outputType, connection.outputNum))
-        for i, (conn_type, num) in enumerate(data):
-            vertex_data = vertex_datadict[i][conn_type]
-            vertex = vertex_data['vertex'](num)
+        types = connection.inputType, connection.outputType
+        for i, vertex in enumerate(vertex_names(connection, vertex_datadict)):
             edge[NAMES[i]] = vertex
-            if vertex not in done_vertices:
-                vertices.append({'name': vertex, 'label': vertex, **vertex_data['data'], **DEFAULT_DATA})
-                done_vertices.append(vertex)
+            if vertex not in vertices:
+                vertices[vertex] = {'name': vertex, 'label': vertex, **vertex_datadict[i][types[i]]['data'],
+                                    **DEFAULT_DATA}
 
         edge['weight'] = connection.weight
         if connection.weight < 0:
@@ -77,10 +96,10 @@ def graph_from_nn(connections, vertex_datadict=None):
         edge['width'] = 1 + 1.25 * (width / 8192.0)
         edges.append(edge)
 
-    return igraph.Graph.DictList(vertices, edges, directed=True)
+    return igraph.Graph.DictList(vertices.values(), edges, directed=True)
 
 
-def render_graph(connections, layout_data=None, vertex_datadict=None):
+def render_graph(connections, layout_data=None, vertex_datadict=None, layout_cache: dict = None):
     g = graph_from_nn(connections, vertex_datadict)
     length = len(g.vs)
     layout_data = layout_data or LAYOUT_DATA
@@ -92,4 +111,85 @@ def render_graph(connections, layout_data=None, vertex_datadict=None):
                 for v in g.vs:
                     v['size'] *= resize_factor
             break
+    if layout_cache is not None:
+        # Vertex positions by name, the vertices of the same topology can come in another order
+        key = topology(connections, vertex_datadict)
+        if (positions := layout_cache.get(key)) is None:
+            positions = layout_cache[key] = dict(zip(g.vs['name'], g.layout(layout).coords))
+        layout = igraph.Layout([positions[name] for name in g.vs['name']])
     return igraph.plot(g, edge_curved=True, bbox=bbox, margin=64, layout=layout)
+
+
+def network_from_genome(genome: np.ndarray, hidden_neurons: int) -> NeuralNetwork:
+    return NeuralNetwork.from_genome([Gene.from_bytes(gene.tobytes()) for gene in genome], hidden_neurons)
+
+
+def rank_survivors(generation: Generation, selection_pressure: SelectionPressure, hidden_neurons: int) -> np.ndarray:
+    # Entities surviving the generation from the best score down, in the order the simulator passes them on. Like the
+    # simulator, it drops the selected entities whose network has no connections.
+    final = generation.positions_at(generation.step_count)
+    scores = selection_pressure.scores(final[:, 0], final[:, 1])
+    genomes = generation.genomes
+    survivors = np.array([entity for entity in np.nonzero(~np.isnan(scores))[0]
+                          if network_from_genome(genomes[entity], hidden_neurons).connections], np.intp)
+    return survivors[np.argsort(-scores[survivors], kind='stable')]
+
+
+def read_generation(deserializer: 'SerializerBase.Deserializer', number: int) -> Generation:
+    if deserializer.generation_count is not None:
+        if not 0 <= number < deserializer.generation_count:
+            raise IndexError(f'generation {number} is not in a recording of {deserializer.generation_count}')
+        deserializer.seek_generation(number)
+    for generation in iter_generations(deserializer):
+        if generation.number == number:
+            return generation
+    raise IndexError(f'generation {number} is not in the recording')
+
+
+def select_networks(generation: Generation, hidden_neurons: int, selection_pressure: SelectionPressure,
+                    top: int = None, distinct=False) -> t.Dict[tuple, t.List[t.Tuple[int, np.ndarray]]]:
+    """Group the genomes of a generation's entities by the topology of their networks.
+
+    By default the survivors are taken from the best down, top keeps the best ones only. distinct takes every entity
+    and keeps the first one of every topology.
+    """
+    genomes = generation.genomes
+    if distinct:
+        entities = np.arange(len(genomes))
+    else:
+        entities = rank_survivors(generation, selection_pressure, hidden_neurons)[:top]
+    groups = {}
+    for entity in entities:
+        key = topology(network_from_genome(genomes[entity], hidden_neurons).connections)
+        if not distinct or key not in groups:
+            groups.setdefault(key, []).append((int(entity), np.array(genomes[entity])))
+    return groups
+
+
+def render_topology(genomes: t.List[t.Tuple[int, np.ndarray]], hidden_neurons: int, out_dir: Path,
+                    generation: int) -> int:
+    layout_cache = {}
+    for entity, genome in genomes:
+        network = network_from_genome(genome, hidden_neurons)
+        render_graph(network.connections, layout_cache=layout_cache).save(str(out_dir / f'{generation}-{entity}.png'))
+    return len(genomes)
+
+
+def render_networks(path, generation: int, out_dir: Path, top: int = None, distinct=False, jobs: int = None) -> int:
+    """Render the networks of a generation to out_dir/<generation>-<entity>.png in worker processes.
+
+    Every worker takes the networks of one topology and lays them out once, so identical networks only differ in the
+    colours and widths of their edges.
+    """
+    from ..serializer.serializer import open_deserializer
+
+    with open_deserializer(path) as deserializer:
+        hidden_neurons = deserializer.params.hiddenNeurons
+        groups = select_networks(read_generation(deserializer, generation), hidden_neurons,
+                                 deserializer.selection_pressure, top, distinct)
+    out_dir.mkdir(exist_ok=True)
+
+    with ProcessPoolExecutor(jobs or os.cpu_count()) as executor:
+        counts = executor.map(render_topology, groups.values(), repeat(hidden_neurons), repeat(out_dir),
+                              repeat(generation))
+        return sum(counts)
@@ -1,6 +1,8 @@
 import typing as t
 from math import sqrt, pi, ceil
 
+import numpy as np
+
 from .vectors import Vector, VectorGroup
 
 if t.TYPE_CHECKING:
@@ -28,6 +30,14 @@ class SelectionPressure(Vector):
     def select_entity(self, entity: 'Entity') -> float | None:
         pass
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # Vectorized select_entity condition, whether positions are inside the selection zone
+        return np.ones(np.shape(x), bool)
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # Vectorized select_entity, NaN where an entity does not survive
+        return np.where(self.zone(x, y), 1.0, np.nan)
+
     def select(self, simulator: 'Simulator') -> SurvivalScores:
         return {
             entity.index: score
@@ -61,6 +71,12 @@ class LeftHalf(SelectionPressure):
         if entity.loc.x <= self.half_pos:
             return 1 - (entity.loc.x / self.half_pos)
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return x <= self.half_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), 1 - (x / self.half_pos), np.nan)
+
 
 class LeftQuarter(SelectionPressure):
     enabled = True
@@ -77,6 +93,12 @@ class LeftQuarter(SelectionPressure):
         if entity.loc.x <= self.quarter_pos:
             return 1 - (entity.loc.x / self.quarter_pos)
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return x <= self.quarter_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), 1 - (x / self.quarter_pos), np.nan)
+
 
 class RightHalf(SelectionPressure):
     enabled = True
@@ -93,6 +115,12 @@ class RightHalf(SelectionPressure):
         if entity.loc.x >= self.half_pos:
             return (entity.loc.x / self.half_pos) - 1
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return x >= self.half_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), (x / self.half_pos) - 1, np.nan)
+
 
 class RightQuarter(SelectionPressure):
     enabled = True
@@ -111,6 +139,12 @@ class RightQuarter(SelectionPressure):
         if entity.loc.x >= self.right_quarter_pos:
             return (entity.loc.x / self.quarter_pos) - 3
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return x >= self.right_quarter_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), (x / self.quarter_pos) - 3, np.nan)
+
 
 class TopHalf(SelectionPressure):
     enabled = True
@@ -127,6 +161,12 @@ class TopHalf(SelectionPressure):
         if entity.loc.y >= self.half_pos:
             return 1 - (entity.loc.y / self.half_pos)
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return y >= self.half_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), 1 - (y / self.half_pos), np.nan)
+
 
 class BottomHalf(SelectionPressure):
     enabled = True
@@ -143,6 +183,12 @@ class BottomHalf(SelectionPressure):
         if entity.loc.y <= self.half_pos:
             return (entity.loc.y / self.half_pos) - 1
 
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return y <= self.half_pos
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.where(self.zone(x, y), (y / self.half_pos) - 1, np.nan)
+
 
 class Circle(SelectionPressure):
     enabled = True
@@ -159,6 +205,8 @@ class Circle(SelectionPressure):
             else:
                 self.radius = radius
         else:
+            self.half_x = parameters.grid.x / 2
+            self.half_y = parameters.grid.y / 2
             self.radius = radius
 
     def to_data(self):
@@ -172,3 +220,10 @@ class Circle(SelectionPressure):
         distance = sqrt((entity.loc.x - self.half_x) ** 2 + (entity.loc.y - self.half_y) ** 2)
         if distance <= self.radius:
             return 1 - (distance / self.radius)
+
+    def zone(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.hypot(x - self.half_x, y - self.half_y) <= self.radius
+
+    def scores(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        distance = np.hypot(x - self.half_x, y - self.half_y)
+        return np.where(distance <= self.radius, 1 - (distance / self.radius), np.nan)
@@ -0,0 +1,318 @@
+import ctypes
+import io
+import typing as t
+import zlib
+from bisect import bisect_right
+from ctypes import c_char_p, c_int, c_uint, c_ulong, c_void_p, POINTER
+from ctypes.util import find_library
+from dataclasses import dataclass, field
+from pathlib import Path
+from struct import Struct
+
+# Random access into gzip streams after zlib's examples/zran.c. A single pass records restart points at deflate block
+# boundaries together with the 32K window preceding them, so inflation can resume there instead of at the file start.
+# The stdlib zlib module cannot stop at block boundaries or prime a bit offset, so this binds libz directly.
+
+WINDOW_SIZE = 32768
+CHUNK_SIZE = 1 << 16
+SPAN = 4 << 20
+
+Z_OK = 0
+Z_STREAM_END = 1
+Z_NEED_DICT = 2
+Z_BUF_ERROR = -5
+Z_NO_FLUSH = 0
+Z_BLOCK = 5
+
+GZIP_WINDOW_BITS = 15 + 32  # zlib or gzip header
+RAW_WINDOW_BITS = -15
+
+SIDECAR_SUFFIX = '.idx'
+SIDECAR_THING = b'SBTGZI'
+SIDECAR_HEADER = Struct(f'<{len(SIDECAR_THING)}sBQLLLL')  # version, compressed size, span, generation size,
+#                                                            generation count, point count
+GENERATION_ENTRY = Struct('<QL')  # uncompressed offset, survivors
+POINT_ENTRY = Struct('<QQBL')  # compressed offset, uncompressed offset, bits, compressed window size
+
+
+class ZStream(ctypes.Structure):
+    _fields_ = [
+        ('next_in', c_void_p),
+        ('avail_in', c_uint),
+        ('total_in', c_ulong),
+        ('next_out', c_void_p),
+        ('avail_out', c_uint),
+        ('total_out', c_ulong),
+        ('msg', c_char_p),
+        ('state', c_void_p),
+        ('zalloc', c_void_p),
+        ('zfree', c_void_p),
+        ('opaque', c_void_p),
+        ('data_type', c_int),
+        ('adler', c_ulong),
+        ('reserved', c_ulong),
+    ]
+
+
+def _load_libz():
+    name = find_library('z')
+    if name is None:
+        return None
+    libz = ctypes.CDLL(name)
+    stream_p = POINTER(ZStream)
+    libz.zlibVersion.restype = c_char_p
+    libz.inflateInit2_.argtypes = (stream_p, c_int, c_char_p, c_int)
+    libz.inflate.argtypes = (stream_p, c_int)
+    libz.inflatePrime.argtypes = (stream_p, c_int, c_int)
+    libz.inflateSetDictionary.argtypes = (stream_p, c_char_p, c_uint)
+    libz.inflateEnd.argtypes = (stream_p,)
+    return libz
+
+
+libz = _load_libz()
+
+
+class Inflater:
+    def __init__(self, window_bits):
+        if libz is None:
+            raise OSError('libz is required for indexed gzip access')
+        self.stream = ZStream()
+        self.input = None
+        self.finished = False
+        self.closed = False
+        self.check(libz.inflateInit2_(ctypes.byref(self.stream), window_bits, libz.zlibVersion(),
+                                      ctypes.sizeof(ZStream)))
+
+    def check(self, ret):
+        if ret < 0 and ret != Z_BUF_ERROR:
+            raise zlib.error(f'Error {ret} while decompressing data: {self.stream.msg}')
+        return ret
+
+    def feed(self, data: bytes):
+        self.input = ctypes.create_string_buffer(data, len(data))
+        self.stream.next_in = ctypes.addressof(self.input)
+        self.stream.avail_in = len(data)
+
+    def prime(self, bits: int, value: int):
+        self.check(libz.inflatePrime(ctypes.byref(self.stream), bits, value))
+
+    def set_dictionary(self, window: bytes):
+        self.check(libz.inflateSetDictionary(ctypes.byref(self.stream), window, len(window)))
+
+    def inflate(self, flush=Z_NO_FLUSH):
+        ret = self.check(libz.inflate(ctypes.byref(self.stream), flush))
+        if ret == Z_NEED_DICT:
+            raise zlib.error('Unexpected preset dictionary')
+        if ret == Z_STREAM_END:
+            self.finished = True
+        return ret
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            libz.inflateEnd(ctypes.byref(self.stream))
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+
+@dataclass
+class RestartPoint:
+    compressed_offset: int
+    offset: int
+    bits: int
+    window: bytes  # compressed as in the sidecar, only the point a reader restarts from is decompressed
+
+    def dictionary(self) -> bytes:
+        return zlib.decompress(self.window)
+
+
+@dataclass
+class GzipIndex:
+    compressed_size: int
+    span: int
+    generation_size: int
+    generations: t.List[t.Tuple[int, int]] = field(default_factory=list)  # uncompressed offset, survivors
+    points: t.List[RestartPoint] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.point_offsets = [point.offset for point in self.points]
+
+    def point_before(self, offset: int) -> RestartPoint | None:
+        i = bisect_right(self.point_offsets, offset)
+        return self.points[i - 1] if i else None
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(SIDECAR_HEADER.pack(SIDECAR_THING, 0, self.compressed_size, self.span, self.generation_size,
+                                        len(self.generations), len(self.points)))
+            f.write(b''.join(GENERATION_ENTRY.pack(*generation) for generation in self.generations))
+            for point in self.points:
+                f.write(POINT_ENTRY.pack(point.compressed_offset, point.offset, point.bits, len(point.window)))
+                f.write(point.window)
+
+    @classmethod
+    def load(cls, path) -> 'GzipIndex':
+        with open(path, 'rb') as f:
+            sidecar_thing, version, compressed_size, span, generation_size, generation_count, point_count = \
+                SIDECAR_HEADER.unpack(f.read(SIDECAR_HEADER.size))
+            if sidecar_thing != SIDECAR_THING or version != 0:
+                raise ValueError(f'{path} is not a recording index')
+            generations = list(GENERATION_ENTRY.iter_unpack(f.read(generation_count * GENERATION_ENTRY.size)))
+            points = []
+            for _ in range(point_count):
+                compressed_offset, offset, bits, window_size = POINT_ENTRY.unpack(f.read(POINT_ENTRY.size))
+                points.append(RestartPoint(compressed_offset, offset, bits, f.read(window_size)))
+        return cls(compressed_size, span, generation_size, generations, points)
+
+
+def sidecar_path(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + SIDECAR_SUFFIX)
+
+
+def load_sidecar(path) -> GzipIndex | None:
+    index_path = sidecar_path(path)
+    if libz is None or not index_path.is_file():
+        return None
+    index = GzipIndex.load(index_path)
+    if index.compressed_size != Path(path).stat().st_size:
+        return None  # stale, the recording changed after it was indexed
+    return index
+
+
+def build_gzip_index(path, data_start: int, generation_size: int, stats_format: Struct, span: int = SPAN) -> GzipIndex:
+    # Stats sit at the end of each fixed size generation, the rest of the stream is only inflated
+    index = GzipIndex(Path(path).stat().st_size, span, generation_size)
+    stats_offset = data_start + generation_size - stats_format.size
+    pending = bytearray()
+    pending_start = 0
+
+    inflater = Inflater(GZIP_WINDOW_BITS)
+    stream = inflater.stream
+    window = ctypes.create_string_buffer(WINDOW_SIZE)
+    window_address = ctypes.addressof(window)
+    total_in = total_out = last = 0
+    with open(path, 'rb') as f:
+        while not inflater.finished and (chunk := f.read(CHUNK_SIZE)):
+            inflater.feed(chunk)
+            while stream.avail_in and not inflater.finished:
+                if not stream.avail_out:
+                    stream.next_out = window_address
+                    stream.avail_out = WINDOW_SIZE
+                start = WINDOW_SIZE - stream.avail_out
+                avail_in = stream.avail_in
+
+                inflater.inflate(Z_BLOCK)
+
+                produced = WINDOW_SIZE - stream.avail_out - start
+                total_in += avail_in - stream.avail_in
+                total_out += produced
+
+                if total_out > stats_offset:
+                    pending += ctypes.string_at(window_address + start, produced)
+                    while pending_start + len(pending) >= stats_offset + stats_format.size:
+                        del pending[:stats_offset - pending_start]
+                        pending_start = stats_offset
+                        index.generations.append((stats_offset + stats_format.size - generation_size,
+                                                  *stats_format.unpack_from(pending)))
+                        stats_offset += generation_size
+                else:
+                    pending.clear()
+                    pending_start = total_out
+
+                # Only the end of a block that is not the last one can be resumed from
+                if stream.data_type & 128 and not stream.data_type & 64 and (not total_out or total_out - last > span):
+                    left = stream.avail_out
+                    window_data = ctypes.string_at(window_address + WINDOW_SIZE - left, left) + \
+                        ctypes.string_at(window_address, WINDOW_SIZE - left)
+                    index.points.append(RestartPoint(total_in, total_out, stream.data_type & 7,
+                                                      zlib.compress(window_data[-total_out:] if total_out else b'')))
+                    last = total_out
+    inflater.close()
+    index.__post_init__()
+    return index
+
+
+class IndexedGzipReader(io.RawIOBase):
+    def __init__(self, path, index: GzipIndex):
+        self.path = path
+        self.index = index
+        self.raw = open(path, 'rb')
+        self.inflater = None
+        self.position = 0
+        self.restart(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def restart(self, offset: int):
+        if self.inflater is not None:
+            self.inflater.close()
+        point = self.index.point_before(offset)
+        if point is None:
+            self.raw.seek(0)
+            self.inflater = Inflater(GZIP_WINDOW_BITS)
+            self.position = 0
+            return
+        self.inflater = Inflater(RAW_WINDOW_BITS)
+        if point.bits:
+            self.raw.seek(point.compressed_offset - 1)
+            self.inflater.prime(point.bits, self.raw.read(1)[0] >> (8 - point.bits))
+        else:
+            self.raw.seek(point.compressed_offset)
+        if window := point.dictionary():
+            self.inflater.set_dictionary(window)
+        self.position = point.offset
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            raise io.UnsupportedOperation('cannot seek from the end of a gzip stream')
+        point = self.index.point_before(offset)
+        if offset < self.position or (point is not None and point.offset > self.position):
+            self.restart(offset)
+        while self.position < offset:
+            if not self.read(min(offset - self.position, CHUNK_SIZE)):
+                break
+        return self.position
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        stream = self.inflater.stream
+        out = (ctypes.c_char * size).from_buffer(buffer)
+        stream.next_out = ctypes.addressof(out)
+        stream.avail_out = size
+        while stream.avail_out and not self.inflater.finished:
+            if not stream.avail_in:
+                chunk = self.raw.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.inflater.feed(chunk)
+            self.inflater.inflate()
+        read = size - stream.avail_out
+        del out
+        self.position += read
+        return read
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+            if self.inflater is not None:
+                self.inflater.close()
+                self.inflater = None
+        super().close()
+
+
+def open_indexed(path, index: GzipIndex) -> io.BufferedReader:
+    reader = io.BufferedReader(IndexedGzipReader(path, index), CHUNK_SIZE)
+    reader.generation_index = index
+    return reader
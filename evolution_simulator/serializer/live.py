@@ -0,0 +1,89 @@
+import asyncio
+import os
+import socket
+import threading
+import typing as t
+from pathlib import Path
+
+QUEUE_SIZE = 4
+CLOSE_TIMEOUT = 5
+
+
+class LivePublisher:
+    """Serves a recording's frames to any number of local clients over a Unix socket while it is being written.
+
+    Clients get the headers when they connect and every frame published after that. Each client has a small queue, a
+    client that cannot keep up loses its oldest queued frames instead of slowing down the simulation.
+    The event loop runs on its own thread, publish() is called from the simulation.
+    """
+
+    def __init__(self, path, header: bytes, queue_size=QUEUE_SIZE):
+        self.path = Path(path)
+        self.header = header
+        self.queue_size = queue_size
+        self.clients: t.Dict[asyncio.Task, asyncio.Queue] = {}
+        self.dropped = 0
+
+        if self.path.is_socket():
+            self.path.unlink()  # left over from a killed run
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='live publisher', daemon=True)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    async def start(self):
+        return await asyncio.start_unix_server(self.serve, self.path)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queue = asyncio.Queue(self.queue_size)
+        self.clients[asyncio.current_task()] = queue
+        try:
+            writer.write(self.header)
+            while (data := await queue.get()) is not None:
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled by stop() when the client does not drain in time, the server logs a handler that ends cancelled
+            pass
+        finally:
+            del self.clients[asyncio.current_task()]
+            writer.close()
+
+    def send(self, queue: asyncio.Queue, data: bytes | None):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(data)
+
+    def broadcast(self, data: bytes | None):
+        for queue in self.clients.values():
+            self.send(queue, data)
+
+    def publish(self, data: bytes):
+        self.loop.call_soon_threadsafe(self.broadcast, data)
+
+    async def stop(self):
+        self.server.close()
+        self.broadcast(None)  # clients finish sending what is queued, then disconnect
+        if self.clients:
+            _, pending = await asyncio.wait(list(self.clients), timeout=CLOSE_TIMEOUT)
+            # Clients still draining are dropped, and finish before the loop stops under them
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        if self.path.is_socket():
+            self.path.unlink()
+
+
+def connect(path) -> t.BinaryIO:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(os.fspath(path))
+    return client.makefile('rb')
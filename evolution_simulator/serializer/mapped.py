@@ -0,0 +1,100 @@
+import numpy as np
+
+from .packing import unpack_actions
+from .serializer import DATA_START, FILE_THING, MAIN_HEADER, SerializerV0, get_serializer
+
+
+def is_mappable(path) -> bool:
+    with open(path, 'rb') as f:
+        header = f.read(MAIN_HEADER.size)
+    return len(header) == MAIN_HEADER.size and MAIN_HEADER.unpack(header) == (FILE_THING, SerializerV0.version)
+
+
+class MappedRecording(SerializerV0.Deserializer):
+    """Memory mapped uncompressed V0 recording, genomes, initial positions and steps are zero-copy views."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.generation_dtype = np.dtype([
+            ('genomes', '<u4', (self.params.entityCount, self.params.genomeLength)),
+            ('positions', np.uint8, (self.params.entityCount, 2)),
+            ('steps', np.uint8, (self.params.generationSteps, self.generation_format.size)),
+            ('stats', '<u4'),
+        ])
+        assert self.generation_dtype.itemsize == self.generation_size_stats
+        self.generations = self.map()
+
+        self.current = None
+        self.step = 0
+
+    @classmethod
+    def open(cls, path) -> 'MappedRecording':
+        with open(path, 'rb') as f:
+            get_serializer(f)
+            return cls(path)
+
+    def map(self):
+        with open(self.path, 'rb') as f:
+            count = (f.seek(0, 2) - DATA_START) // self.generation_size_stats
+        if not count:
+            return np.empty(0, self.generation_dtype)
+        return np.memmap(self.path, self.generation_dtype, 'r', DATA_START, (count,))
+
+    def refresh(self):
+        # Picks up generations appended since the file was mapped
+        self.generations = self.map()
+
+    @property
+    def generation_count(self):
+        return len(self.generations)
+
+    @property
+    def survivors(self) -> np.ndarray:
+        return self.generations['stats']
+
+    def genomes(self, generation: int) -> np.ndarray:
+        return self.generations['genomes'][generation]
+
+    def initial_positions(self, generation: int) -> np.ndarray:
+        return self.generations['positions'][generation]
+
+    def steps(self, generation: int) -> np.ndarray:
+        return self.generations['steps'][generation]
+
+    def step_offsets(self, generation: int, step: int = None) -> np.ndarray:
+        steps = self.steps(generation)
+        return unpack_actions(steps if step is None else steps[step], self.params.entityCount)
+
+    def generation_stats(self, generation: int):
+        return int(self.generations['stats'][generation]),
+
+    def read_stats(self):
+        if self.generation >= len(self.generations):
+            return None
+        self.current = self.generation
+        self.step = 0
+        return self.generation_stats(self.generation)
+
+    def next_generation(self):
+        return self.read_stats()
+
+    def read_payload(self):
+        return self.generations[self.current:self.current + 1].view(np.uint8)[:self.generation_size_no_stats].data
+
+    def read_genomes(self):
+        return self.genomes(self.current)
+
+    def read_initial_positions(self):
+        return self.initial_positions(self.current)
+
+    def read_step_offsets(self):
+        self.step += 1
+        return self.step_offsets(self.current, self.step - 1)
+
+    def read_generation_offsets(self):
+        self.step = self.params.generationSteps
+        return self.step_offsets(self.current)
+
+    def seek_generation(self, generation: int):
+        self.generation = generation
@@ -0,0 +1,143 @@
+import typing as t
+
+import numpy as np
+
+ACTION_BITS = 2
+ACTION_MASK = (1 << ACTION_BITS) - 1
+
+
+def pack_actions(offsets: np.ndarray) -> np.ndarray:
+    """Pack (..., entities, 2) movement offsets into the V0 DoubleAction wire format.
+
+    Each offset axis is stored as a 2-bit signed field and two entities share a byte, the first one in the low nibble.
+    An odd entity count is padded with a still entity.
+    """
+    nibbles = (offsets[..., 0] & ACTION_MASK) | ((offsets[..., 1] & ACTION_MASK) << ACTION_BITS)
+    nibbles = nibbles.astype(np.uint8)
+    if nibbles.shape[-1] % 2:
+        nibbles = np.concatenate((nibbles, np.zeros((*nibbles.shape[:-1], 1), np.uint8)), axis=-1)
+    return nibbles[..., 0::2] | (nibbles[..., 1::2] << 4)
+
+
+def unpack_actions(packed: np.ndarray, entity_count: int) -> np.ndarray:
+    """Unpack DoubleAction bytes of shape (..., bytes) into (..., entity_count, 2) int8 movement offsets."""
+    fields = packed.view(np.int8)[..., None] << np.array((6, 4, 2, 0), np.int8)
+    fields >>= 6  # arithmetic shift sign-extends the 2-bit fields
+    return fields.reshape(*packed.shape[:-1], -1, 2)[..., :entity_count, :]
+
+
+def unpack_positions(data: bytes) -> np.ndarray:
+    """View PosStruct bytes as an (entities, 2) uint8 array of x, y."""
+    return np.frombuffer(data, np.uint8).reshape(-1, 2)
+
+
+def position_keyframes(initial: np.ndarray, offsets: np.ndarray, interval: int) -> np.ndarray:
+    """Positions after every interval-th step as (keyframes, entities, 2) uint8 from (steps, entities, 2) offsets."""
+    positions = np.cumsum(offsets, axis=0, dtype=np.int16)[interval - 1::interval] + initial
+    return positions.astype(np.uint8)
+
+
+def unpack_genomes(data: bytes, genome_length: int) -> np.ndarray:
+    """View genome bytes as an (entities, genome_length) array of little-endian uint32 genes."""
+    return np.frombuffer(data, '<u4').reshape(-1, genome_length)
+
+
+GENOME_INDEX = np.dtype('<u2')
+
+
+def pack_genome_table(genomes: t.Iterable[bytes]) -> bytes:
+    """Store each distinct genome once, followed by a uint16 table index per entity."""
+    table = {}
+    indexes = np.fromiter((table.setdefault(genome, len(table)) for genome in genomes), GENOME_INDEX)
+    return np.array(len(table), GENOME_INDEX).tobytes() + b''.join(table) + indexes.tobytes()
+
+
+def genome_table_size(data, entity_count: int, genome_size: int) -> int:
+    count = int(np.frombuffer(data, GENOME_INDEX, 1)[0])
+    return GENOME_INDEX.itemsize * (1 + entity_count) + count * genome_size
+
+
+def unpack_genome_table(data, entity_count: int, genome_length: int) -> np.ndarray:
+    count = int(np.frombuffer(data, GENOME_INDEX, 1)[0])
+    table = np.frombuffer(data, '<u4', count * genome_length, GENOME_INDEX.itemsize).reshape(-1, genome_length)
+    indexes = np.frombuffer(data, GENOME_INDEX, entity_count, GENOME_INDEX.itemsize + table.nbytes)
+    return table[indexes]
+
+
+GENOME_KEYFRAME = 1
+GENOME_LINEAGE = 2
+LINEAGE_FIELDS = (('bases', GENOME_INDEX), ('donors', GENOME_INDEX), ('starts', np.uint8), ('stops', np.uint8))
+MUTATION_COUNT = np.dtype('<u4')
+MUTATION_FIELDS = (('entities', GENOME_INDEX), ('genes', np.uint8), ('masks', '<u4'))
+
+
+def crossover_genomes(previous: np.ndarray, bases: np.ndarray, donors: np.ndarray, starts: np.ndarray,
+                      stops: np.ndarray) -> np.ndarray:
+    genes = np.arange(previous.shape[1])
+    crossover = (genes >= starts[:, None]) & (genes < stops[:, None])
+    return np.where(crossover, previous[donors], previous[bases])
+
+
+def pack_genome_lineage(genomes: np.ndarray, previous: np.ndarray | None, lineage: t.Sequence[np.ndarray] | None,
+                        keyframe: bool) -> bytes:
+    """Store each child as its parents, crossover range and XOR masks of the genes that differ from the crossover.
+
+    Keyframes store the full genomes instead. Lineage columns are kept in keyframes too, for ancestry queries.
+    """
+    flags = (GENOME_KEYFRAME if keyframe else 0) | (GENOME_LINEAGE if lineage is not None else 0)
+    parts = [np.array(flags, np.uint8).tobytes()]
+    if keyframe:
+        parts.append(genomes.astype('<u4').tobytes())
+    if lineage is not None:
+        parts.extend(np.asarray(column, dtype).tobytes() for column, (_, dtype) in zip(lineage, LINEAGE_FIELDS))
+        if not keyframe:
+            difference = genomes ^ crossover_genomes(previous, *lineage)
+            entities, genes = np.nonzero(difference)
+            parts.append(np.array(len(entities), MUTATION_COUNT).tobytes())
+            parts.extend(np.asarray(column, dtype).tobytes() for column, (_, dtype) in
+                         zip((entities, genes, difference[entities, genes]), MUTATION_FIELDS))
+    return b''.join(parts)
+
+
+def _read_columns(data, offset: int, count: int, fields) -> t.Tuple[t.Dict[str, np.ndarray], int]:
+    columns = {}
+    for name, dtype in fields:
+        columns[name] = np.frombuffer(data, dtype, count, offset)
+        offset += columns[name].nbytes
+    return columns, offset
+
+
+def _read_genome_lineage(data, entity_count: int, genome_length: int):
+    flags = data[0]
+    offset = 1
+    genomes = lineage = mutations = None
+    if flags & GENOME_KEYFRAME:
+        genomes = np.frombuffer(data, '<u4', entity_count * genome_length, offset).reshape(-1, genome_length)
+        offset += genomes.nbytes
+    if flags & GENOME_LINEAGE:
+        lineage, offset = _read_columns(data, offset, entity_count, LINEAGE_FIELDS)
+        if not flags & GENOME_KEYFRAME:
+            count = int(np.frombuffer(data, MUTATION_COUNT, 1, offset)[0])
+            mutations, offset = _read_columns(data, offset + MUTATION_COUNT.itemsize, count, MUTATION_FIELDS)
+    return genomes, lineage, mutations, offset
+
+
+def genome_lineage_size(data, entity_count: int, genome_length: int) -> int:
+    return _read_genome_lineage(data, entity_count, genome_length)[3]
+
+
+def is_genome_keyframe(data) -> bool:
+    return bool(data[0] & GENOME_KEYFRAME)
+
+
+def unpack_lineage(data, entity_count: int, genome_length: int) -> t.Dict[str, np.ndarray] | None:
+    return _read_genome_lineage(data, entity_count, genome_length)[1]
+
+
+def unpack_genome_lineage(data, previous: np.ndarray | None, entity_count: int, genome_length: int) -> np.ndarray:
+    genomes, lineage, mutations, _ = _read_genome_lineage(data, entity_count, genome_length)
+    if genomes is not None:
+        return genomes
+    genomes = crossover_genomes(previous, lineage['bases'], lineage['donors'], lineage['starts'], lineage['stops'])
+    genomes[mutations['entities'], mutations['genes']] ^= mutations['masks']
+    return genomes
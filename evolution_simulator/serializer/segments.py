@@ -0,0 +1,157 @@
+import gzip
+import json
+import os
+import time
+import typing as t
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from .serializer import SERIALIZERS, SerializerV0
+
+if t.TYPE_CHECKING:
+    from ..simulator import Simulator
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 0
+
+
+@dataclass
+class Segment:
+    name: str
+    first_generation: int
+    generations: int = 0
+    size: int = 0
+    complete: bool = False
+
+
+@dataclass
+class Manifest:
+    format: int
+    segments: t.List[Segment] = field(default_factory=list)
+    finished: bool = False
+    version: int = MANIFEST_VERSION
+
+    def save(self, directory: Path):
+        # Readers only ever see a whole manifest, the rename replaces the old one atomically
+        temporary = directory / f'.{MANIFEST_NAME}.tmp'
+        with open(temporary, 'w', encoding='UTF-8') as f:
+            json.dump(asdict(self), f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, directory / MANIFEST_NAME)
+
+    @classmethod
+    def load(cls, directory: Path) -> 'Manifest':
+        with open(Path(directory) / MANIFEST_NAME, encoding='UTF-8') as f:
+            data = json.load(f)
+        if data['version'] != MANIFEST_VERSION:
+            raise ValueError(f'{directory} has an unsupported manifest version {data["version"]}')
+        data['segments'] = [Segment(**segment) for segment in data['segments']]
+        return cls(**data)
+
+
+def is_segmented(path) -> bool:
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+
+class SegmentedSerializer:
+    """Writes a run as a directory of independent recordings of at most N generations or M bytes each.
+
+    Every segment has its own headers and is readable on its own, the manifest lists them and is rewritten whenever
+    a segment is started or completed.
+    """
+
+    def __init__(self, simulator: 'Simulator', Parameters, directory: Path, segment_version=0,
+                 segment_generations=None, segment_size=None, gzip_segments=True, **serializer_options):
+        self.simulator = simulator
+        self.Parameters = Parameters
+        self.directory = Path(directory)
+        self.version = segment_version
+        self.segment_generations = segment_generations
+        self.segment_size = segment_size
+        self.gzip_segments = gzip_segments and segment_version == SerializerV0.version
+        self.serializer_options = serializer_options
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest = Manifest(segment_version)
+        self.generation = 0
+        self.file = self.stream = self.serializer = None
+        self.open_segment()
+
+    @property
+    def segment(self) -> Segment:
+        return self.manifest.segments[-1]
+
+    def open_segment(self):
+        previous = self.serializer
+        suffix = '.evo.gz' if self.gzip_segments else '.evo'
+        self.manifest.segments.append(Segment(f'segment-{len(self.manifest.segments):05d}{suffix}', self.generation))
+        self.file = open(self.directory / self.segment.name, 'wb')
+        self.stream = gzip.GzipFile(fileobj=self.file, mode='wb') if self.gzip_segments else self.file
+        self.serializer = SERIALIZERS[self.version](self.stream).Serializer(self.simulator, self.Parameters,
+                                                                             **self.serializer_options)
+        if previous is not None:
+            self.serializer.resume_from(previous)
+
+        # The simulator calls these for every entity, so they skip this class
+        self.entity_move = self.serializer.entity_move
+        self.write_genomes = self.serializer.write_genomes
+        self.write_initial_pos = self.serializer.write_initial_pos
+        self.manifest.save(self.directory)
+
+    def close_segment(self):
+        self.serializer.close()
+        if self.stream is not self.file:
+            self.stream.close()
+        self.segment.size = self.file.tell()
+        self.file.close()
+        self.segment.complete = True
+
+    def write_generation(self, indexes: t.List[int]):
+        self.serializer.write_generation(indexes)
+        self.generation += 1
+        self.segment.generations += 1
+        if (self.segment_generations and self.segment.generations >= self.segment_generations) or \
+                (self.segment_size and self.file.tell() >= self.segment_size):
+            self.close_segment()
+            self.open_segment()
+
+    def close(self):
+        self.close_segment()
+        if not self.segment.generations:
+            # Rotated right before the run ended
+            os.remove(self.directory / self.segment.name)
+            self.manifest.segments.pop()
+        self.manifest.finished = True
+        self.manifest.save(self.directory)
+
+
+def iter_segments(directory, follow=False, poll_interval=1.0) -> t.Iterator[t.Tuple[Path, Segment]]:
+    """Completed segments in order. Following waits for the writer to complete more until it finishes the run."""
+    directory = Path(directory)
+    done = 0
+    while True:
+        manifest = Manifest.load(directory)
+        for segment in manifest.segments[done:]:
+            if not segment.complete:
+                break
+            yield directory / segment.name, segment
+            done += 1
+        if not follow or (manifest.finished and done == len(manifest.segments)):
+            return
+        time.sleep(poll_interval)
+
+
+def map_segments(function: t.Callable[[Path, Segment], t.Any], directory, jobs: int = None, follow=False,
+                 poll_interval=1.0) -> t.Iterator:
+    """Apply a picklable function to every completed segment in a process pool, results are yielded in order."""
+    pending = deque()
+    with ProcessPoolExecutor(jobs) as executor:
+        for path, segment in iter_segments(directory, follow, poll_interval):
+            pending.append(executor.submit(function, path, segment))
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
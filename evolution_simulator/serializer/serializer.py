@@ -1,12 +1,22 @@
+import gzip
+import json
+import lzma
 import typing as t
-from io import BytesIO
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager, redirect_stdout
+from io import BytesIO, StringIO, UnsupportedOperation
 from itertools import zip_longest
 from math import ceil
 from struct import Struct, calcsize
 
 import numpy as np
 
-from .structures import ParamsHeader, ParamsHeader_size, PosStruct, DoubleAction, UINT8_STRUCT
+from .gzip_index import load_sidecar, open_indexed
+from .packing import pack_actions, unpack_actions, unpack_genomes, unpack_positions, pack_genome_table, \
+    genome_table_size, unpack_genome_table, pack_genome_lineage, genome_lineage_size, unpack_genome_lineage, \
+    unpack_lineage, is_genome_keyframe, position_keyframes
+from .structures import ParamsHeader, ParamsHeader_size, PosStruct
 from ..models import Coord
 from ..selection_pressure import selection_pressures
 
@@ -17,6 +27,18 @@ if t.TYPE_CHECKING:
 BYTE_ORDER = '<'
 FILE_THING = b'SBTEVO'
 MAIN_HEADER = Struct(f'{BYTE_ORDER}{len(FILE_THING)}sB')
+DATA_START = MAIN_HEADER.size + ParamsHeader_size
+GZIP_MAGIC = b'\x1f\x8b'
+
+NO_COMPRESSION = 0
+ZLIB = 1
+LZMA = 2
+COMPRESSIONS = {'none': NO_COMPRESSION, 'zlib': ZLIB, 'lzma': LZMA}
+
+GENOMES_RAW = 0
+GENOMES_DEDUPLICATED = 1
+GENOMES_LINEAGE = 2
+GENOME_ENCODINGS = {'raw': GENOMES_RAW, 'dedup': GENOMES_DEDUPLICATED, 'lineage': GENOMES_LINEAGE}
 
 File = t.BinaryIO | t.TextIO
 FileOrBytes = bytes | File
@@ -68,12 +90,35 @@ class SerializerBase(metaclass=SerializerBaseMeta):
         def write_generation(self, indexes: t.List[int], time: float):
             pass
 
+        def resume_from(self, previous: 'SerializerBase.Serializer'):
+            # Continues the run recorded by another serializer, e.g. in the next segment
+            pass
+
+        def close(self):
+            pass
+
     class Deserializer:
         base: t.Type['SerializerBase']
 
+        generation_count: int | None = None
+
         def __init__(self):
-            self.fd = self.base.fd
+            self.file = self.base.fd
+            self.fd = self.file
             self.generation_size = None
+            self.generation = 0
+
+        def read_stats(self):
+            pass
+
+        def next_generation(self):
+            pass
+
+        def read_payload(self):
+            pass
+
+        def skip_payload(self):
+            pass
 
         def read_genomes(self):
             pass
@@ -87,6 +132,9 @@ class SerializerBase(metaclass=SerializerBaseMeta):
         def skip_stats(self):
             pass
 
+        def seek_generation(self, generation: int):
+            raise UnsupportedOperation(f'{self.__class__.__qualname__} cannot seek')
+
 
 class SerializerV0(SerializerBase):
     version = 0
@@ -131,15 +179,17 @@ class SerializerV0(SerializerBase):
             self.fd.write(params_header.to_bytes())
 
         def initialize_entity_actions(self):
-            self.entity_actions = np.empty((self.steps_per_generation + int(self.steps_per_generation % 2 != 0),
-                                            self.Parameters.World.entity_count), dtype=object)
+            if self.entity_actions is None:
+                self.entity_actions = np.zeros((self.steps_per_generation, self.entity_count, 2), dtype=np.int8)
+            else:
+                self.entity_actions.fill(0)
 
         def write_genomes(self, entities: t.List['Entity']):
             for entity in entities:
                 self.fd.write(b''.join(gene.to_bytes() for gene in entity.genome))
 
         def entity_move(self, entity: 'Entity', sim: 'Simulator', offset: 'Coord'):
-            self.entity_actions[sim.step, entity.index - 1] = offset
+            self.entity_actions[sim.step, entity.index - 1] = offset.x, offset.y
 
         def write_initial_pos(self, entities: t.List['Entity']):
             self.fd.write(b''.join(
@@ -147,13 +197,11 @@ class SerializerV0(SerializerBase):
                 for entity in entities
             ))
 
+        def write_steps(self):
+            self.fd.write(pack_actions(self.entity_actions).tobytes())
+
         def write_generation(self, indexes: t.List[int]):
-            for step in self.entity_actions.reshape(self.steps_per_generation, -1, 2):
-                self.fd.write(b''.join(DoubleAction(offset1.x if offset1 is not None else 0,
-                                                    offset1.y if offset1 is not None else 0,
-                                                    offset2.x if offset2 is not None else 0,
-                                                    offset2.y if offset2 is not None else 0).to_bytes()
-                                       for offset1, offset2 in step))
+            self.write_steps()
             self.fd.write(self.base.stat_format.pack(len(indexes)))
 
             self.initialize_entity_actions()
@@ -164,12 +212,11 @@ class SerializerV0(SerializerBase):
         def __init__(self):
             super().__init__()
 
-            self.params = ParamsHeader.from_bytes(self.fd.read(ParamsHeader_size))
+            self.params = ParamsHeader.from_bytes(self.file.read(ParamsHeader_size))
 
             self.mutation_rate = self.params.mutationRate / 1024
             self.population_sensor_radius = self.params.populationSensorRadius / 10
 
-            self.odd_enemies = self.params.entityCount % 2 == 0
             self.action_count = ceil(self.params.entityCount / 2)
 
             self.selection_pressure = selection_pressures[self.params.selectionPressure].from_data(
@@ -187,44 +234,580 @@ class SerializerV0(SerializerBase):
                                             (self.generation_format.size * self.params.generationSteps)
             self.generation_size_stats = self.generation_size_no_stats + self.base.stat_format.size
 
+            self.generation_index = getattr(self.file, 'generation_index', None)
+            self.payload = None
+
+        @property
+        def generation_count(self):
+            return len(self.generation_index.generations) if self.generation_index is not None else None
+
+        def generation_stats(self, generation: int):
+            if self.generation_index is None:
+                raise UnsupportedOperation('stats lookup needs an index, see the index subcommand')
+            return tuple(self.generation_index.generations[generation][1:])
+
         def read_stats(self):
-            self.fd.read(self.generation_size_no_stats)
-            data = self.fd.read(self.base.stat_format.size)
-            if data:
-                stats = self.base.stat_format.unpack(data)
-                self.fd.seek(-self.generation_size_stats, 1)
-                return stats
-            else:
+            stats = self.next_generation()
+            if stats is None or (payload := self.read_payload()) is None:
+                return None
+            self.fd = BytesIO(payload)
+            return stats
+
+        def next_generation(self):
+            # The whole generation is buffered so the stats at its end never need a backwards seek,
+            # which gzip streams implement by decompressing again from the start of the file
+            data = self.file.read(self.generation_size_stats)
+            if len(data) < self.generation_size_stats:
                 return None
+            self.payload = memoryview(data)[:self.generation_size_no_stats]
+            return self.base.stat_format.unpack_from(data, self.generation_size_no_stats)
+
+        def read_payload(self):
+            return self.payload
+
+        def skip_payload(self):
+            self.payload = None
+
+        def genomes_size(self, payload) -> int:
+            return self.genome_size * self.params.entityCount
+
+        def decode_genomes(self, payload):
+            return unpack_genomes(payload[:self.genomes_size(payload)], self.params.genomeLength)
 
         def read_genomes(self):
-            dat = self.fd.read(self.genome_size * self.params.entityCount)
+            payload = self.fd.getbuffer()[self.fd.tell():]
+            self.fd.seek(self.genomes_size(payload), 1)
+            return self.decode_genomes(payload)
 
-        def _read_chunks(self, total_size, chunk_size):
-            data = self.fd.read(total_size)
-            return [
-                data[i:i + chunk_size]
-                for i in range(0, total_size, chunk_size)
-            ]
+        def read_initial_positions(self):
+            return unpack_positions(self.fd.read(self.init_pos_format.size))
 
         def read_initial_pos(self):
-            return [
-                Coord.from_pos_struct(PosStruct.from_bytes(chunk))
-                for chunk in self._read_chunks(self.init_pos_format.size, 2)
-            ]
+            return [Coord(x, y) for x, y in self.read_initial_positions().tolist()]
+
+        def read_step_offsets(self):
+            data = np.frombuffer(self.fd.read(self.generation_format.size), np.uint8)
+            return unpack_actions(data, self.params.entityCount)
+
+        def read_generation_offsets(self):
+            data = np.frombuffer(self.fd.read(self.generation_format.size * self.params.generationSteps), np.uint8)
+            return unpack_actions(data.reshape(self.params.generationSteps, -1), self.params.entityCount)
 
         def read_step(self):
-            entity_actions = []
-            for i, chunk in enumerate(self.fd.read(self.generation_format.size)):
-                UINT8_STRUCT.pack_into(double_action := DoubleAction(), 0, chunk)
+            return [Coord(x, y) for x, y in self.read_step_offsets().tolist()]
+
+        def position_keyframe(self, payload, step: int) -> t.Tuple[int, np.ndarray]:
+            start = self.genomes_size(payload)
+            return 0, unpack_positions(payload[start:start + self.init_pos_format.size])
+
+        def positions_at(self, payload, step: int) -> np.ndarray:
+            # Entity positions after the given number of steps, from the closest keyframe at or before it
+            keyframe_step, positions = self.position_keyframe(payload, step)
+            positions = positions.astype(np.int16)
+            if step > keyframe_step:
+                start = self.genomes_size(payload) + self.init_pos_format.size
+                packed = np.frombuffer(payload, np.uint8, (step - keyframe_step) * self.generation_format.size,
+                                       start + keyframe_step * self.generation_format.size)
+                offsets = unpack_actions(packed.reshape(step - keyframe_step, -1), self.params.entityCount)
+                positions += offsets.sum(axis=0, dtype=np.int16)
+            return positions
+
+        def skip_stats(self):
+            self.generation += 1
+
+        def seek_generation(self, generation: int):
+            if self.generation_index is not None:
+                self.file.seek(self.generation_index.generations[generation][0])
+            else:
+                self.file.seek(DATA_START + generation * self.generation_size_stats)
+            self.generation = generation
+
+
+def compress_block(data: bytes, compression: int, level: int = -1) -> bytes:
+    if compression == ZLIB:
+        return zlib.compress(data, level)
+    elif compression == LZMA:
+        return lzma.compress(data, preset=6 if level < 0 else level)
+    return data
+
+
+def decompress_block(data: bytes, compression: int) -> bytes:
+    if compression == ZLIB:
+        return zlib.decompress(data)
+    elif compression == LZMA:
+        return lzma.decompress(data)
+    return data
+
+
+class SerializerV1(SerializerV0):
+    """Every generation is an independently compressed block framed with its size and stats.
+
+    Closing the serializer appends an empty end frame and an index of block offsets and stats, followed by a fixed size
+    footer pointing at it.
+    A file without the footer (e.g. a killed run) is still readable by walking the frames.
+    """
+    version = 1
+    header_format = Struct(f'{BYTE_ORDER}BBHH')  # compression, genome encoding, genome keyframe interval,
+    #                                             position keyframe interval
+    frame_format = Struct(f'{BYTE_ORDER}L{SerializerV0.stat_format.format[1:]}')  # block size, stats
+    index_format = Struct(f'{BYTE_ORDER}Q{frame_format.format[1:]}')  # frame offset, block size, stats
+    END_FRAME = frame_format.pack(0, 0)
+    INDEX_THING = b'SBTIDX'
+    footer_format = Struct(f'{BYTE_ORDER}QL{len(INDEX_THING)}s')  # index offset, generation count
+    data_start = DATA_START + header_format.size
+
+    @classmethod
+    def pack_header(cls, compression: int, genome_encoding: int, genome_keyframe_interval: int,
+                    position_keyframe_interval: int) -> bytes:
+        # Checked before anything is written, both intervals go in H header fields
+        if not 1 <= genome_keyframe_interval <= 0xFFFF:
+            raise ValueError(f'genome keyframe interval {genome_keyframe_interval} is not between 1 and 65535')
+        if not 0 <= position_keyframe_interval <= 0xFFFF:
+            raise ValueError(f'position keyframe interval {position_keyframe_interval} is not between 0 and 65535')
+        return cls.header_format.pack(compression, genome_encoding, genome_keyframe_interval,
+                                      position_keyframe_interval)
+
+    class Serializer(SerializerV0.Serializer):
+        base: t.Type['SerializerV1']
+
+        def __init__(self, simulator, Parameters, compression=ZLIB, level=-1, genome_encoding=GENOMES_RAW,
+                     genome_keyframe_interval=32, position_keyframe_interval=0):
+            header = self.base.pack_header(compression, genome_encoding, genome_keyframe_interval,
+                                           position_keyframe_interval)
+            super().__init__(simulator, Parameters)
+            self.compression = compression
+            self.level = level
+            self.genome_encoding = genome_encoding
+            self.genome_keyframe_interval = genome_keyframe_interval
+            self.position_keyframe_interval = position_keyframe_interval
+            self.initial_positions = None
+
+            self.generation = 0
+            self.previous_genomes = None
+            self.parents = None
+
+            self.file = self.fd
+            self.file.write(header)
+            self.offset = self.base.data_start
+            self.index = []
+
+            self.fd = BytesIO()
+
+        def write_genomes(self, entities: t.List['Entity']):
+            if self.genome_encoding == GENOMES_DEDUPLICATED:
+                self.fd.write(pack_genome_table(b''.join(gene.to_bytes() for gene in entity.genome)
+                                                for entity in entities))
+            elif self.genome_encoding == GENOMES_LINEAGE:
+                self.write_genome_lineage(entities)
+            else:
+                super().write_genomes(entities)
+
+        def write_genome_lineage(self, entities: t.List['Entity']):
+            genomes = unpack_genomes(b''.join(gene.to_bytes() for entity in entities for gene in entity.genome),
+                                     self.genome_length)
+            lineage = None
+            if self.parents is not None and all(entity.lineage is not None for entity in entities):
+                # Lineage indexes point into the ranked survivors, the recording points at previous entities
+                parents = np.array(self.parents)
+                lineage = (
+                    parents[[entity.lineage.base for entity in entities]],
+                    parents[[entity.lineage.donor for entity in entities]],
+                    np.array([entity.lineage.crossover_start for entity in entities]),
+                    np.array([entity.lineage.crossover_stop for entity in entities]),
+                )
+            keyframe = lineage is None or self.generation % self.genome_keyframe_interval == 0
+            self.fd.write(pack_genome_lineage(genomes, self.previous_genomes, lineage, keyframe))
+            self.previous_genomes = genomes
+
+        def write_initial_pos(self, entities: t.List['Entity']):
+            super().write_initial_pos(entities)
+            if self.position_keyframe_interval:
+                self.initial_positions = np.array([(entity.loc.x, entity.loc.y) for entity in entities], np.int16)
+
+        def write_position_keyframes(self):
+            # After the steps, so readers of the V0 layout never see them
+            if self.position_keyframe_interval:
+                self.fd.write(position_keyframes(self.initial_positions, self.entity_actions,
+                                                 self.position_keyframe_interval).tobytes())
+
+        def write_generation(self, indexes: t.List[int]):
+            self.write_steps()
+            self.write_position_keyframes()
+            self.write_block(compress_block(self.fd.getvalue(), self.compression, self.level), len(indexes))
+            self.fd = BytesIO()
+            self.parents = indexes
+            self.generation += 1
+
+            self.initialize_entity_actions()
+
+        def write_block(self, block: bytes, *stats):
+            self.file.write(self.base.frame_format.pack(len(block), *stats))
+            self.file.write(block)
+            self.index.append((self.offset, len(block), *stats))
+            self.offset += self.base.frame_format.size + len(block)
+
+        def close(self):
+            self.file.write(self.base.END_FRAME)
+            self.offset += len(self.base.END_FRAME)
+            self.file.write(b''.join(self.base.index_format.pack(*entry) for entry in self.index))
+            self.file.write(self.base.footer_format.pack(self.offset, len(self.index), self.base.INDEX_THING))
 
-                entity_actions.append(Coord(double_action.moveX1, double_action.moveY1))
-                if i != self.action_count or not self.odd_enemies:
-                    entity_actions.append(Coord(double_action.moveX2, double_action.moveY2))
-            return entity_actions
+    class Deserializer(SerializerV0.Deserializer):
+        base: t.Type['SerializerV1']
+
+        def __init__(self):
+            super().__init__()
+            self.compression, self.genome_encoding, self.genome_keyframe_interval, self.position_keyframe_interval = \
+                self.base.header_format.unpack(self.file.read(self.base.header_format.size))
+            self.genome_cache = None
+            self.data_start = self.base.data_start + self.read_header_extension()
+            self.index = self.read_index()
+            self.block_size = 0
+
+        @property
+        def generation_count(self):
+            return len(self.index) if self.index is not None else None
+
+        def read_header_extension(self) -> int:
+            return 0
+
+        def read_index(self):
+            try:
+                self.file.seek(-self.base.footer_format.size, 2)
+            except (OSError, ValueError, UnsupportedOperation):
+                return None  # not seekable, frames are read as they come
+
+            index_offset, count, index_thing = self.base.footer_format.unpack(
+                self.file.read(self.base.footer_format.size))
+            if index_thing == self.base.INDEX_THING:
+                self.file.seek(index_offset)
+                index = list(self.base.index_format.iter_unpack(
+                    self.file.read(count * self.base.index_format.size)))
+            else:
+                index = self.scan_frames()
+            self.file.seek(self.data_start)
+            return index
+
+        def scan_frames(self):
+            index = []
+            end = self.file.seek(0, 2)
+            offset = self.data_start
+            while offset + self.base.frame_format.size <= end:
+                self.file.seek(offset)
+                size, *stats = self.base.frame_format.unpack(self.file.read(self.base.frame_format.size))
+                if not size:
+                    break  # end of the blocks
+                if offset + self.base.frame_format.size + size > end:
+                    break  # truncated block
+                index.append((offset, size, *stats))
+                offset += self.base.frame_format.size + size
+            return index
+
+        def read_frame(self):
+            if self.index is not None:
+                if self.generation >= len(self.index):
+                    return None
+                offset, size, *stats = self.index[self.generation]
+                self.file.seek(offset + self.base.frame_format.size)
+            else:
+                data = self.file.read(self.base.frame_format.size)
+                if len(data) < self.base.frame_format.size:
+                    return None
+                size, *stats = self.base.frame_format.unpack(data)
+                if not size:
+                    return None
+            return size, tuple(stats)
+
+        def genomes_size(self, payload) -> int:
+            if self.genome_encoding == GENOMES_DEDUPLICATED:
+                return genome_table_size(payload, self.params.entityCount, self.genome_size)
+            elif self.genome_encoding == GENOMES_LINEAGE:
+                return genome_lineage_size(payload, self.params.entityCount, self.params.genomeLength)
+            return super().genomes_size(payload)
+
+        def decode_genomes(self, payload, generation: int = None):
+            if self.genome_encoding == GENOMES_DEDUPLICATED:
+                return unpack_genome_table(payload, self.params.entityCount, self.params.genomeLength)
+            elif self.genome_encoding == GENOMES_LINEAGE:
+                generation = self.generation if generation is None else generation
+                if self.genome_cache is not None and self.genome_cache[0] == generation:
+                    return self.genome_cache[1]
+                previous = None if is_genome_keyframe(payload) else self.genomes_at(generation - 1)
+                genomes = unpack_genome_lineage(payload, previous, self.params.entityCount, self.params.genomeLength)
+                self.genome_cache = generation, genomes
+                return genomes
+            return super().decode_genomes(payload)
+
+        def position_keyframe(self, payload, step: int) -> t.Tuple[int, np.ndarray]:
+            if not self.position_keyframe_interval or step < self.position_keyframe_interval:
+                return super().position_keyframe(payload, step)
+            keyframe = step // self.position_keyframe_interval
+            start = self.genomes_size(payload) + self.init_pos_format.size + \
+                self.generation_format.size * self.params.generationSteps + \
+                (keyframe - 1) * self.init_pos_format.size
+            return keyframe * self.position_keyframe_interval, \
+                unpack_positions(payload[start:start + self.init_pos_format.size])
+
+        def payload_at(self, generation: int):
+            if self.index is None:
+                raise UnsupportedOperation('random access needs the index footer')
+            offset, size, *_ = self.index[generation]
+            self.file.seek(offset + self.base.frame_format.size)
+            return decompress_block(self.file.read(size), self.compression)
+
+        def genomes_at(self, generation: int):
+            if self.genome_encoding != GENOMES_LINEAGE:
+                return self.decode_genomes(self.payload_at(generation))
+            if self.genome_cache is not None and self.genome_cache[0] == generation:
+                return self.genome_cache[1]
+            if self.index is None:
+                raise UnsupportedOperation(f'genomes of generation {generation} were not decoded before moving on')
+            # Walk back to the closest keyframe, then apply the deltas forwards
+            chain = [(generation, self.payload_at(generation))]
+            while not is_genome_keyframe(chain[-1][1]):
+                if self.genome_cache is not None and self.genome_cache[0] == chain[-1][0] - 1:
+                    break
+                chain.append((chain[-1][0] - 1, self.payload_at(chain[-1][0] - 1)))
+            for chain_generation, payload in reversed(chain):
+                genomes = self.decode_genomes(payload, chain_generation)
+            return genomes
+
+        def read_lineage(self, generation: int) -> t.Dict[str, np.ndarray] | None:
+            # bases and donors are entity indexes in the previous generation
+            if self.genome_encoding != GENOMES_LINEAGE:
+                return None
+            return unpack_lineage(self.payload_at(generation), self.params.entityCount, self.params.genomeLength)
+
+        def ancestors(self, generation: int, entity: int) -> t.List[t.Tuple[int, int]]:
+            # Generation and entity index of the base parent of each earlier generation, as far as lineage is recorded
+            ancestry = []
+            while generation > 0 and (lineage := self.read_lineage(generation)) is not None:
+                generation, entity = generation - 1, int(lineage['bases'][entity])
+                ancestry.append((generation, entity))
+            return ancestry
+
+        def next_generation(self):
+            frame = self.read_frame()
+            if frame is None:
+                return None
+            self.block_size, stats = frame
+            return stats
+
+        def read_payload(self):
+            block = self.file.read(self.block_size)
+            if len(block) < self.block_size:
+                return None
+            self.payload = decompress_block(block, self.compression)
+            return self.payload
+
+        def skip_payload(self):
+            if self.index is not None:
+                return
+            if self.genome_encoding == GENOMES_LINEAGE:
+                self.read_payload()  # the next generation's genomes are deltas against these
+            else:
+                self.file.read(self.block_size)
 
         def skip_stats(self):
-            self.fd.seek(self.base.stat_format.size, 1)
+            if self.genome_encoding == GENOMES_LINEAGE and self.index is None and self.payload is not None:
+                self.decode_genomes(self.payload)
+            self.payload = None
+            super().skip_stats()
+
+        def generation_stats(self, generation: int):
+            return tuple(self.index[generation][2:])
+
+        def seek_generation(self, generation: int):
+            if self.index is None:
+                if generation < self.generation:
+                    raise UnsupportedOperation('cannot seek backwards in a stream')
+                while self.generation < generation and (frame := self.read_frame()) is not None:
+                    self.file.read(frame[0])
+                    self.generation += 1
+            self.generation = generation
+
+
+class SerializerReplay(SerializerV1):
+    """Only the seed, the generator state each generation starts from and the genomes it is bred from are recorded.
+
+    Movement is rebuilt on demand by simulating the generation again, with the config stored in the header rather than
+    the local config.yml. Blocks are framed and indexed like V1, payloads are rebuilt in the V0 layout.
+    """
+    version = 2
+    replay_header_format = Struct(f'{BYTE_ORDER}QL')  # seed, config size
+    record_format = Struct(f'{BYTE_ORDER}HH')  # generator state size, breeding pool size
+
+    class Serializer(SerializerV1.Serializer):
+        base: t.Type['SerializerReplay']
+
+        def __init__(self, simulator, Parameters, compression=ZLIB, level=-1, seed=0):
+            super().__init__(simulator, Parameters, compression, level)
+            self.simulator = simulator
+
+            config = Parameters.config_text.encode()
+            self.file.write(self.base.replay_header_format.pack(seed, len(config)))
+            self.file.write(config)
+            self.offset += self.base.replay_header_format.size + len(config)
+
+            # The first generation is spawned after the serializer is created
+            self.state = self.generator_state()
+            self.pool = []
+
+        def resume_from(self, previous: 'SerializerReplay.Serializer'):
+            self.pool = previous.pool
+
+        def generator_state(self) -> bytes:
+            return json.dumps(self.simulator.prng.bit_generator.state).encode()
+
+        def write_genomes(self, entities: t.List['Entity']):
+            pass
+
+        def entity_move(self, entity: 'Entity', sim: 'Simulator', offset: 'Coord'):
+            pass
+
+        def write_initial_pos(self, entities: t.List['Entity']):
+            pass
+
+        def write_generation(self, indexes: t.List[int]):
+            record = self.base.record_format.pack(len(self.state), len(self.pool)) + self.state
+            if self.pool:
+                record += pack_genome_table(self.pool)
+            self.write_block(compress_block(record, self.compression, self.level), len(indexes))
+            self.generation += 1
+
+            # Called before the next generation is spawned from the survivors
+            self.state = self.generator_state()
+            self.pool = [b''.join(gene.to_bytes() for gene in self.simulator.entities[index].genome)
+                         for index in indexes]
+
+    class Deserializer(SerializerV1.Deserializer):
+        base: t.Type['SerializerReplay']
+
+        cache_size = 16
+
+        def read_header_extension(self) -> int:
+            from ..parameters import load_parameters
+
+            self.seed, config_size = self.base.replay_header_format.unpack(
+                self.file.read(self.base.replay_header_format.size))
+            self.config_text = self.file.read(config_size).decode()
+            self.Parameters = load_parameters(self.config_text)
+            self.rebuilt = OrderedDict()
+            return self.base.replay_header_format.size + config_size
+
+        def read_record(self, record) -> t.Tuple[dict, np.ndarray]:
+            state_size, pool_size = self.base.record_format.unpack_from(record)
+            state = json.loads(bytes(record[self.base.record_format.size:self.base.record_format.size + state_size]))
+            pool = unpack_genome_table(record[self.base.record_format.size + state_size:], pool_size,
+                                       self.params.genomeLength) if pool_size else ()
+            return state, pool
+
+        def cached(self, generation: int) -> bytes | None:
+            if generation in self.rebuilt:
+                self.rebuilt.move_to_end(generation)
+            return self.rebuilt.get(generation)
+
+        def rebuild(self, generation: int, record, stats: tuple) -> bytes:
+            if (payload := self.cached(generation)) is None:
+                payload = self.simulate(generation, *self.read_record(record), *stats)
+                self.rebuilt[generation] = payload
+                if len(self.rebuilt) > self.cache_size:
+                    self.rebuilt.popitem(last=False)
+            return payload
+
+        def simulate(self, generation: int, state: dict, pool: np.ndarray, survivors: int) -> bytes:
+            from ..entity.genome import Gene
+            from ..simulator import Simulator
+
+            recording = BytesIO()
+            prng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+            with redirect_stdout(StringIO()):
+                simulator = Simulator(prng, recording, SerializerV0.version, self.Parameters)
+                prng.bit_generator.state = state
+                simulator.populate([[Gene.from_bytes(gene.tobytes()) for gene in genome] for genome in pool])
+                simulator.generation = generation
+                rebuilt_survivors = simulator.run_generation()
+            if rebuilt_survivors != survivors:
+                raise ValueError(f'Generation {generation} did not replay the recorded run, '
+                                 f'{rebuilt_survivors} survivors instead of {survivors}')
+            return recording.getvalue()[DATA_START:DATA_START + self.generation_size_no_stats]
+
+        def payload_at(self, generation: int):
+            if (payload := self.cached(generation)) is not None:
+                return payload
+            return self.rebuild(generation, super().payload_at(generation), self.generation_stats(generation))
+
+        def next_generation(self):
+            self.stats = super().next_generation()
+            return self.stats
+
+        def read_payload(self):
+            if super().read_payload() is None:
+                return None
+            self.payload = self.rebuild(self.generation, self.payload, self.stats)
+            return self.payload
+
+
+class SerializerLive(SerializerV1):
+    """V1 blocks published to a Unix socket while the simulation runs, see live.LivePublisher.
+
+    Slow readers miss frames, so every frame carries its generation number and genomes are never deltas.
+    """
+    version = 3
+    live_frame_format = Struct(f'{BYTE_ORDER}LL{SerializerV0.stat_format.format[1:]}')  # block size, generation, stats
+
+    class Serializer(SerializerV1.Serializer):
+        base: t.Type['SerializerLive']
+
+        def __init__(self, simulator, Parameters, socket_path, compression=ZLIB, level=-1, genome_encoding=GENOMES_RAW,
+                     queue_size=None):
+            from .live import LivePublisher, QUEUE_SIZE
+
+            if genome_encoding == GENOMES_LINEAGE:
+                raise ValueError('Live streams drop frames, the lineage genome encoding needs every one of them')
+            super().__init__(simulator, Parameters, compression, level, genome_encoding)
+            # The base class wrote the headers into the file, new clients are sent them when they connect
+            self.publisher = LivePublisher(socket_path, self.file.getvalue(), queue_size or QUEUE_SIZE)
+
+        def write_block(self, block: bytes, *stats):
+            self.publisher.publish(self.base.live_frame_format.pack(len(block), self.generation, *stats) + block)
+
+        def close(self):
+            self.publisher.close()
+
+    class Deserializer(SerializerV1.Deserializer):
+        base: t.Type['SerializerLive']
+
+        def read_index(self):
+            return None
+
+        def read_frame(self):
+            data = self.file.read(self.base.live_frame_format.size)
+            if len(data) < self.base.live_frame_format.size:
+                return None
+            size, self.generation, *stats = self.base.live_frame_format.unpack(data)
+            return size, tuple(stats)
+
+
+def open_recording(path) -> File:
+    with open(path, 'rb') as f:
+        magic = f.read(len(GZIP_MAGIC))
+    if magic == GZIP_MAGIC:
+        if (index := load_sidecar(path)) is not None:
+            return open_indexed(path, index)
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+@contextmanager
+def open_deserializer(path) -> t.Iterator[SerializerBase.Deserializer]:
+    from .mapped import MappedRecording, is_mappable
+
+    if is_mappable(path):
+        yield MappedRecording.open(path)
+        return
+    with open_recording(path) as f:
+        yield get_serializer(f).Deserializer()
 
 
 def get_serializer(fd: FileOrBytes) -> SerializerBaseMeta:
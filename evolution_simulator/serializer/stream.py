@@ -0,0 +1,98 @@
+import typing as t
+
+import numpy as np
+
+from .packing import unpack_actions, unpack_positions
+
+if t.TYPE_CHECKING:
+    from .serializer import SerializerBase
+
+
+class Generation:
+    """One generation of a recording, its payload is only read and decoded when something asks for it.
+
+    Streams cannot go back, so once the iterator has moved on an unloaded generation is no longer available.
+    """
+
+    def __init__(self, deserializer: 'SerializerBase.Deserializer', number: int, stats: tuple):
+        self.deserializer = deserializer
+        self.number = number
+        self.stats = stats
+        self.survivors = stats[0]
+
+        self.expired = False
+        self._payload = None
+
+        params = deserializer.params
+        self.entity_count = params.entityCount
+        self.step_count = params.generationSteps
+        self._genomes_size = None
+        self.positions_size = deserializer.init_pos_format.size
+        self.step_size = deserializer.generation_format.size
+
+    @property
+    def loaded(self):
+        return self._payload is not None
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            if self.expired:
+                raise RuntimeError(f'Generation {self.number} was skipped and is no longer available')
+            self._payload = self.deserializer.read_payload()
+            if self._payload is None:
+                raise EOFError(f'Generation {self.number} is truncated')
+        return self._payload
+
+    @property
+    def genomes_size(self) -> int:
+        if self._genomes_size is None:
+            self._genomes_size = self.deserializer.genomes_size(self.payload)
+        return self._genomes_size
+
+    @property
+    def genomes(self) -> np.ndarray:
+        return self.deserializer.decode_genomes(self.payload)
+
+    @property
+    def initial_positions(self) -> np.ndarray:
+        return unpack_positions(self.payload[self.genomes_size:self.genomes_size + self.positions_size])
+
+    def packed_steps(self) -> np.ndarray:
+        return np.frombuffer(self.payload, np.uint8, self.step_count * self.step_size,
+                             self.genomes_size + self.positions_size).reshape(self.step_count, self.step_size)
+
+    def step(self, step: int) -> np.ndarray:
+        return unpack_actions(self.packed_steps()[step], self.entity_count)
+
+    def steps(self) -> t.Iterator[np.ndarray]:
+        packed = self.packed_steps()
+        for step in range(self.step_count):
+            yield unpack_actions(packed[step], self.entity_count)
+
+    def offsets(self) -> np.ndarray:
+        return unpack_actions(self.packed_steps(), self.entity_count)
+
+    def positions_at(self, step: int) -> np.ndarray:
+        return self.deserializer.positions_at(self.payload, step)
+
+    def positions(self) -> t.Iterator[np.ndarray]:
+        # Entity positions after every step, starting with the initial ones
+        positions = self.initial_positions.astype(np.int16)
+        yield positions.copy()
+        for offsets in self.steps():
+            positions += offsets
+            yield positions.copy()
+
+    def __repr__(self):
+        return f'{self.__class__.__qualname__}({self.number}, survivors={self.survivors})'
+
+
+def iter_generations(deserializer: 'SerializerBase.Deserializer') -> t.Iterator[Generation]:
+    while (stats := deserializer.next_generation()) is not None:
+        generation = Generation(deserializer, deserializer.generation, stats)
+        yield generation
+        if not generation.loaded:
+            deserializer.skip_payload()
+        generation.expired = True
+        deserializer.skip_stats()
@@ -0,0 +1,78 @@
+import os
+import typing as t
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from .serializer import FILE_THING, GENOMES_RAW, MAIN_HEADER, SerializerV0, SerializerV1, compress_block, \
+    decompress_block, open_deserializer
+from .structures import ParamsHeader
+
+
+class BlockWriter:
+    """Writes already compressed generation blocks as a V1 recording, without a simulator behind it."""
+    base = SerializerV1
+
+    def __init__(self, file: t.BinaryIO, params: ParamsHeader, compression: int):
+        self.file = file
+        self.file.write(MAIN_HEADER.pack(FILE_THING, self.base.version))
+        self.file.write(params.to_bytes())
+        self.file.write(self.base.pack_header(compression, GENOMES_RAW, 1, 0))  # every raw genome table is a keyframe
+        self.offset = self.base.data_start
+        self.index = []
+
+    write_block = SerializerV1.Serializer.write_block
+    close = SerializerV1.Serializer.close
+
+
+def _bounded(executor: Executor, function, items: t.Iterable[tuple], jobs: int) -> t.Iterator[tuple]:
+    # Submits ahead of the consumer by a few blocks per worker, so memory does not grow with the recording
+    pending = deque()
+    for item, *args in items:
+        pending.append((item, executor.submit(function, *args)))
+        if len(pending) > jobs * 2:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def transcode(source, target, compression: int, level: int = -1, jobs: int = None) -> t.Tuple[int, int]:
+    """Convert a V0 recording to V1, compressing the independent generation blocks in a process pool.
+
+    Returns the uncompressed and compressed payload sizes.
+    """
+    jobs = jobs or os.cpu_count()
+    with open_deserializer(source) as deserializer:
+        if deserializer.base.version != SerializerV0.version:
+            raise ValueError(f'{source} is not a V0 recording')
+        with open(target, 'wb') as f, ProcessPoolExecutor(jobs) as executor:
+            writer = BlockWriter(f, deserializer.params, compression)
+
+            def generations():
+                while (stats := deserializer.next_generation()) is not None:
+                    yield stats, bytes(deserializer.read_payload()), compression, level
+                    deserializer.skip_stats()
+
+            size = compressed_size = 0
+            for stats, block in _bounded(executor, compress_block, generations(), jobs):
+                writer.write_block(block, *stats)
+                size += deserializer.generation_size_no_stats
+                compressed_size += len(block)
+            writer.close()
+    return size, compressed_size
+
+
+def read_payloads(path, jobs: int = None) -> t.Iterator[t.Tuple[tuple, bytes]]:
+    """Stats and decompressed payload of every generation of a V1 recording, decompressed in a process pool."""
+    jobs = jobs or os.cpu_count()
+    with open_deserializer(path) as deserializer, ProcessPoolExecutor(jobs) as executor:
+        if deserializer.base.version != SerializerV1.version:
+            raise ValueError(f'{path} is not a block compressed recording')
+
+        def blocks():
+            while (stats := deserializer.next_generation()) is not None:
+                yield stats, deserializer.file.read(deserializer.block_size), deserializer.compression
+                deserializer.skip_stats()
+
+        yield from _bounded(executor, decompress_block, blocks(), jobs)
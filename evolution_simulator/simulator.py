@@ -5,10 +5,10 @@ import numpy as np
 
 from .entity import Entity, init_entities
 from .entity.genome import NeuralNetwork
-from .entity.genome import generate_child_genome
+from .entity.genome import generate_child
 from .models import Coord
-from .parameters import Parameters
-from .serializer.serializer import SerializerV0
+from .parameters import ParameterSnapshot, Parameters, compile_parameters
+from .serializer.serializer import SERIALIZERS
 import signal
 
 
@@ -33,12 +33,15 @@ class DelayedKeyboardInterrupt:
 
 
 class Simulator:
-    def __init__(self, prng, fd):
+    def __init__(self, prng, fd, version=0, parameters: t.Type[Parameters] | ParameterSnapshot = Parameters,
+                 serializer_type=None, **serializer_options):
         self.prng = prng
-        self.Parameters: t.Type[Parameters] = Parameters
+        self.Parameters = compile_parameters(parameters)
         pressure, data = self.Parameters.Simulation.selection_pressure
         self.selection_pressure = pressure(self.Parameters, *data)
-        self.serializer = SerializerV0(fd).Serializer(self, self.Parameters)
+        if serializer_type is None:
+            serializer_type = SERIALIZERS[version](fd).Serializer
+        self.serializer = serializer_type(self, self.Parameters, **serializer_options)
 
         self.grid = np.zeros((self.Parameters.World.grid_x, self.Parameters.World.grid_y), dtype=np.uint16)  # 65_536
 
@@ -73,7 +76,8 @@ class Simulator:
             return ValueError
 
     def loc_in_bounds(self, loc):
-        return 0 <= loc.x < self.Parameters.World.grid_x and 0 <= loc.y < self.Parameters.World.grid_y
+        world = self.Parameters.World
+        return 0 <= loc.x < world.grid_x and 0 <= loc.y < world.grid_y
 
     def is_empty(self, loc):
         return self.loc_in_bounds(loc) and not self.entity_at_pos(loc)
@@ -87,21 +91,25 @@ class Simulator:
             until = false_func
         while not until(self):
             with DelayedKeyboardInterrupt():
-                print('Generation: ', self.generation)
-                self.serializer.write_genomes(self.entities)
-                self.serializer.write_initial_pos(self.entities)
-                start = perf_counter()
-                for self.step in range(self.Parameters.Simulation.steps_per_generation):
-                    for entity in self.entities:
-                        if entity.alive:
-                            self.step_entity(entity)
-                    if self.selection_pressure.on_step:
-                        self.selection_pressure.on_step(self)
-                self.spawn_new_gen()
-                gen_time = perf_counter() - start
-                print('Time taken: ', gen_time)
-                self.generation += 1
-                print()
+                self.run_generation()
+
+    def run_generation(self):
+        print('Generation: ', self.generation)
+        self.serializer.write_genomes(self.entities)
+        self.serializer.write_initial_pos(self.entities)
+        start = perf_counter()
+        for self.step in range(self.Parameters.Simulation.steps_per_generation):
+            for entity in self.entities:
+                if entity.alive:
+                    self.step_entity(entity)
+            if self.selection_pressure.on_step:
+                self.selection_pressure.on_step(self)
+        survivors = self.spawn_new_gen()
+        gen_time = perf_counter() - start
+        print('Time taken: ', gen_time)
+        self.generation += 1
+        print()
+        return survivors
 
     def step_entity(self, entity):
         entity.age += 1
@@ -118,6 +126,10 @@ class Simulator:
         indexes = [d[0] - 1 for d in sorted(survival_scores.items(), key=lambda d: d[1], reverse=True)]
         genomes = [self.entities[index].genome for index in indexes]
         self.serializer.write_generation(indexes)
+        self.populate(genomes)
+        return len(indexes)
+
+    def populate(self, genomes):
         self.grid.fill(0)
         if genomes:
             self.create_new_gen(genomes)
@@ -131,11 +143,12 @@ class Simulator:
         for i, val in enumerate(self.prng.choice(m * n, self.Parameters.World.entity_count, False), start=1):
             loc = np.unravel_index(val, grid_shape)
             self.grid[loc] = i
-            genome = generate_child_genome(self.prng, genomes, self.Parameters.Entities.choose_parents_by_fitness,
-                                           self.Parameters.Entities.sexual_reproduction,
-                                           self.Parameters.Entities.point_mutation_rate)
+            genome, lineage = generate_child(self.prng, genomes, self.Parameters.Entities.choose_parents_by_fitness,
+                                             self.Parameters.Entities.sexual_reproduction,
+                                             self.Parameters.Entities.point_mutation_rate)
             self.entities.append(
                 Entity(i, Coord(*loc), NeuralNetwork.from_genome(genome, self.Parameters.Entities.max_hidden_neurons),
                        genome,
                        self.prng,
-                       self.Parameters.Entities.responsiveness_curve_kfactor))
+                       self.Parameters.Entities.responsiveness_curve_kfactor,
+                       lineage))
@@ -0,0 +1,143 @@
+import csv
+import itertools
+import os
+import typing as t
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from pathlib import Path
+from time import perf_counter
+
+import yaml
+from numpy.random import default_rng
+
+from .parameters import Parameters, load_parameters, override_config
+
+SEARCHES = ('grid', 'random')
+
+SUMMARY_COLUMNS = ('seed', 'final_survivors', 'mean_survivors', 'runtime', 'generations_per_second',
+                   'entity_steps_per_second')
+
+
+class SweepSpec(t.NamedTuple):
+    """What a sweep runs, read from a YAML file such as
+
+        generations: 50
+        seeds: [1, 2, 3]  # or a count, seeds 0 to count - 1
+        search: random  # or grid, every combination of the listed values
+        samples: 20  # configurations drawn by a random search
+        sample_seed: 0
+        parameters:
+          entities.point_mutation_rate: {low: 0.001, high: 0.05}  # random search only, integers if both are
+          entities.genome_length: [4, 8, 16]
+    """
+    generations: int
+    seeds: t.Tuple[int, ...]
+    search: str
+    parameters: t.Dict[str, t.Any]
+    samples: int = 1
+    sample_seed: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> 'SweepSpec':
+        with open(path, encoding='UTF-8') as f:
+            spec = yaml.safe_load(f)
+        seeds = spec.get('seeds', 1)
+        spec['seeds'] = tuple(range(seeds) if isinstance(seeds, int) else seeds)
+        spec.setdefault('search', 'grid')
+        if spec['search'] not in SEARCHES:
+            raise ValueError(f'unknown search {spec["search"]}, expected one of {", ".join(SEARCHES)}')
+        for key, values in spec['parameters'].items():
+            if isinstance(values, dict) and spec['search'] != 'random':
+                raise ValueError(f'{key} is a range, which only a random search can draw from')
+        return cls(**spec)
+
+    def configurations(self) -> t.List[t.Dict[str, t.Any]]:
+        keys = list(self.parameters)
+        if self.search == 'grid':
+            return [dict(zip(keys, values)) for values in itertools.product(*self.parameters.values())]
+
+        prng = default_rng(self.sample_seed)
+        configurations = []
+        for _ in range(self.samples):
+            configuration = {}
+            for key, values in self.parameters.items():
+                if not isinstance(values, dict):
+                    value = values[prng.integers(len(values))]
+                elif isinstance(values['low'], int) and isinstance(values['high'], int):
+                    value = int(prng.integers(values['low'], values['high'], endpoint=True))
+                else:
+                    value = float(prng.uniform(values['low'], values['high']))
+                configuration[key] = value
+            configurations.append(configuration)
+        return configurations
+
+
+def run_cell(config_text: str, seed: int, generations: int) -> t.Tuple[t.List[int], float]:
+    # The run evolve --seed would make, without a recording
+    from .serializer.serializer import SerializerV0
+    from .simulator import Simulator
+
+    parameters = load_parameters(config_text)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), open(os.devnull, 'wb') as recording:
+        simulator = Simulator(default_rng(seed), recording, SerializerV0.version, parameters)
+        start = perf_counter()
+        survivors = [simulator.run_generation() for _ in range(generations)]
+        return survivors, perf_counter() - start
+
+
+def finished_cells(path: Path, keys: t.Sequence[str], columns: t.Sequence[str]) -> t.Set[t.Tuple[str, ...]]:
+    if not path.exists():
+        return set()
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        # Another parameter set or generation count would append rows that do not match the header
+        if reader.fieldnames is not None and reader.fieldnames != list(columns):
+            raise ValueError(f'{path} holds the results of a sweep over other parameters or generations')
+        return {tuple(row[key] for key in (*keys, 'seed')) for row in reader}
+
+
+def sweep(spec: SweepSpec, out_path: Path, config_text: str = None, jobs: int = None) -> int:
+    """Run every configuration of spec with every seed in a process pool, appending a row per run to out_path.
+
+    Rows hold the swept values, the survivors of every generation, the runtime and the throughput. Runs that already
+    have a row are skipped, so an interrupted sweep continues where it stopped.
+    """
+    config_text = Parameters.config_text if config_text is None else config_text
+    keys = list(spec.parameters)
+    columns = [*keys, *SUMMARY_COLUMNS, *(f'survivors_{generation}' for generation in range(spec.generations))]
+
+    # Every configuration is checked before anything runs
+    cells = []
+    done = finished_cells(out_path, keys, columns)
+    for configuration in spec.configurations():
+        text = override_config(config_text, configuration)
+        parameters = load_parameters(text)
+        for seed in spec.seeds:
+            if tuple(str(value) for value in (*configuration.values(), seed)) not in done:
+                cells.append((configuration, seed, text, parameters))
+
+    new = not out_path.exists() or not out_path.stat().st_size
+    with open(out_path, 'a', newline='') as f, ProcessPoolExecutor(jobs or os.cpu_count()) as executor:
+        writer = csv.DictWriter(f, columns)
+        if new:
+            writer.writeheader()
+        futures = {executor.submit(run_cell, text, seed, spec.generations): (configuration, seed, parameters)
+                   for configuration, seed, text, parameters in cells}
+        for future in as_completed(futures):
+            configuration, seed, parameters = futures[future]
+            survivors, runtime = future.result()
+            entity_steps = parameters.World.entity_count * parameters.Simulation.steps_per_generation * len(survivors)
+            writer.writerow({
+                **configuration,
+                'seed': seed,
+                'final_survivors': survivors[-1],
+                'mean_survivors': sum(survivors) / len(survivors),
+                'runtime': runtime,
+                'generations_per_second': len(survivors) / runtime,
+                'entity_steps_per_second': entity_steps / runtime,
+                **{f'survivors_{generation}': count for generation, count in enumerate(survivors)},
+            })
+            f.flush()
+            print(f'Ran {", ".join(f"{key}={value}" for key, value in configuration.items())} seed {seed} '
+                  f'in {runtime:.2f}s, {survivors[-1]} survivors')
+    return len(cells)